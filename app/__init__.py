@@ -2,34 +2,101 @@ from flask import Flask
 from flask_pymongo import PyMongo
 from flask_mail import Mail
 from flask_cors import CORS
+from pymongo import MongoClient
 from config import Config
 
 mongo = PyMongo()
 mail = Mail()
 
-def create_app():
+def reconnect_mongo(app):
+    # MongoClient is not fork-safe: a worker forked from a preloaded parent
+    # gets its own client instead of the sockets and monitor threads copied
+    # from the parent
+    from app.mongo_pool import mongo_client_options
+    mongo.cx = MongoClient(app.config['MONGO_URI'], connect=False, **mongo_client_options(app.config))
+    if mongo.db is not None:
+        mongo.db = mongo.cx[mongo.db.name]
+
+def create_app(asgi=False):
     app = Flask(__name__)
     app.config.from_object(Config)
     
     # Initialize extensions with CORS configuration
     CORS(app, resources={
         r"/api/*": {
-            "origins": ["http://localhost:3000"],
+            "origins": Config.CORS_ORIGINS,
             "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
             "allow_headers": ["Content-Type", "Authorization", "Accept"]
         }
     })
     
-    # Initialize MongoDB with the URI from config
+    # Initialize MongoDB with the URI and pool settings from config
+    from app.mongo_pool import mongo_client_options
     app.config["MONGO_URI"] = Config.MONGO_URI
-    mongo.init_app(app)
+    mongo.init_app(app, **mongo_client_options(app.config))
     mail.init_app(app)
     
+    # Serialize BSON types (ObjectId, datetime, cursors) as plain JSON; this
+    # replaces the extended-JSON provider installed by PyMongo.init_app
+    from app.serialization import MongoJSONProvider
+    app.json = MongoJSONProvider(app)
+    
+    # Per-request timing, /metrics and request logs
+    from app import metrics
+    metrics.init_app(app)
+    
+    from app.profiler import profiler
+    profiler.configure(app.config)
+    
+    # Size the in-process caches from config
+    from app.cache import configure_caches
+    configure_caches(app.config)
+    from app.contact_cache import contact_cache
+    contact_cache.configure(app.config)
+    
+    from app.passwords import hasher
+    from app.hash_pool import hash_service
+    hasher.configure(app.config)
+    hash_service.configure(app.config)
+    
+    from app.search import configure_search
+    configure_search(app.config)
+    
+    from app.events import configure_events
+    configure_events(app.config)
+    
+    # Activity log pipeline
+    from app.activity import activity_log
+    activity_log.configure(app.config)
+    
+    # Outgoing mail queue
+    from app.outbox import outbox
+    outbox.init_app(app)
+    
     # Register blueprints
     from app.routes.auth import auth_bp
     from app.routes.contacts import contacts_bp
+    from app.routes.admin import admin_bp
     
     app.register_blueprint(auth_bp)
     app.register_blueprint(contacts_bp)
+    app.register_blueprint(admin_bp)
+    
+    # Management commands (flask ensure-indexes, flask check-query-plans)
+    from app.commands import register_commands
+    register_commands(app)
+    
+    # Make sure the indexes behind the hot queries exist
+    if app.config.get('MONGO_ENSURE_INDEXES'):
+        from app.indexes import ensure_indexes
+        from app.retention import retention_indexes
+        with app.app_context():
+            ensure_indexes(mongo.db, extra=retention_indexes(app.config))
+    
+    # Serve the hot auth and contact routes from async views on an ASGI
+    # server, the rest of the API keeps running on this app
+    if asgi:
+        from app.asgi import create_asgi_app
+        return create_asgi_app(app)
     
     return app
\ No newline at end of file
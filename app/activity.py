@@ -0,0 +1,332 @@
+import atexit
+import os
+import queue
+import threading
+import time
+import bson
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+from app import mongo
+from app.retention import record_rollups
+from app.stats import bump_versions
+
+SYNC = 'sync'
+ASYNC = 'async'
+DISABLED = 'disabled'
+
+_STOP = object()
+
+# First wait before a failed background flush is retried, doubled each time
+RETRY_BACKOFF = 0.2
+
+# Contact fields copied onto an activity for display; the rest of the contact
+# is reachable through contact._id
+CONTACT_DISPLAY_FIELDS = ('registration_number',)
+
+# Fields get_stats reads back for the recent activity list
+ACTIVITY_DISPLAY_PROJECTION = {
+    'user_id': 1,
+    'type': 1,
+    'details': 1,
+    'timestamp': 1,
+    'contact._id': 1,
+    **{f'contact.{field}': 1 for field in CONTACT_DISPLAY_FIELDS}
+}
+
+
+def contact_reference(contact):
+    contact_id = contact['_id']
+    if isinstance(contact_id, str):
+        try:
+            contact_id = ObjectId(contact_id)
+        except InvalidId:
+            pass
+    reference = {'_id': contact_id}
+    for field in CONTACT_DISPLAY_FIELDS:
+        if field in contact:
+            reference[field] = contact[field]
+    return reference
+
+
+def contact_activity(user_id, activity_type, details, contact, timestamp):
+    return {
+        'user_id': user_id,
+        'type': activity_type,
+        'details': details,
+        'timestamp': timestamp,
+        'contact': contact_reference(contact)
+    }
+
+
+class ActivityWriter:
+    # Audit log pipeline for the `activities` collection.
+    #
+    # sync      insert on the request thread (previous behaviour)
+    # async     enqueue and let a background thread flush with insert_many
+    #           once batch_size events are queued or flush_interval passes
+    # disabled  drop events
+    #
+    # When the queue stays full for longer than enqueue_timeout the event is
+    # written synchronously instead, so a slow database pushes back on the
+    # request that produced the event rather than losing it. A background
+    # flush that fails is retried write_retries times with a short backoff
+    # before its events are counted as errors.
+
+    def __init__(self, mode=ASYNC, batch_size=100, flush_interval=0.5,
+                 queue_size=10000, enqueue_timeout=0.05, write_retries=3):
+        self.mode = mode
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
+        self.enqueue_timeout = enqueue_timeout
+        self.write_retries = write_retries
+        self._lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self.enqueued = 0
+        self.written = 0
+        self.flushes = 0
+        self.sync_writes = 0
+        self.retries = 0
+        self.errors = 0
+
+    def configure(self, config):
+        self.stop()
+        self.mode = config.get('ACTIVITY_LOG_MODE', self.mode)
+        self.batch_size = config.get('ACTIVITY_LOG_BATCH_SIZE', self.batch_size)
+        self.flush_interval = config.get('ACTIVITY_LOG_FLUSH_INTERVAL', self.flush_interval)
+        self.queue_size = config.get('ACTIVITY_LOG_QUEUE_SIZE', self.queue_size)
+        self.enqueue_timeout = config.get('ACTIVITY_LOG_ENQUEUE_TIMEOUT', self.enqueue_timeout)
+        self.write_retries = config.get('ACTIVITY_LOG_WRITE_RETRIES', self.write_retries)
+        if self.mode not in (SYNC, ASYNC, DISABLED):
+            raise ValueError(f'Unknown ACTIVITY_LOG_MODE: {self.mode}')
+
+    def record(self, activity):
+        self.record_many([activity])
+
+    def record_many(self, activities):
+        if not activities or self.mode == DISABLED:
+            return
+        if self.mode == SYNC:
+            self._write(activities, sync=True)
+            return
+
+        work = self._ensure_worker()
+        for index, activity in enumerate(activities):
+            try:
+                work.put(activity, timeout=self.enqueue_timeout)
+                self.enqueued += 1
+            except queue.Full:
+                # Backpressure: write what is left on the caller's thread
+                self._write(activities[index:], sync=True)
+                return
+
+    def record_nowait(self, activity):
+        # Queue without waiting, for callers on an event loop. Returns False
+        # when the event needs record() instead (sync mode or a full queue),
+        # which the caller runs on a thread.
+        if self.mode == DISABLED:
+            return True
+        if self.mode != ASYNC:
+            return False
+        try:
+            self._ensure_worker().put_nowait(activity)
+        except queue.Full:
+            return False
+        self.enqueued += 1
+        return True
+
+    def flush(self, timeout=5.0):
+        # Block until everything queued so far has been written
+        work = self._queue
+        if work is None or self._pid != os.getpid():
+            return True
+        with work.all_tasks_done:
+            return work.all_tasks_done.wait_for(lambda: work.unfinished_tasks == 0, timeout)
+
+    def stop(self, timeout=5.0):
+        with self._lock:
+            work, thread = self._queue, self._thread
+            self._queue = self._thread = None
+        if thread is None or self._pid != os.getpid():
+            return
+        work.put(_STOP)
+        thread.join(timeout)
+
+        # Anything the worker did not get to is written inline
+        leftover = []
+        while True:
+            try:
+                item = work.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                leftover.append(item)
+        if leftover:
+            self._write(leftover, sync=True)
+
+    def stats(self):
+        work = self._queue
+        return {
+            'mode': self.mode,
+            'queue_depth': work.qsize() if work is not None else 0,
+            'queue_size': self.queue_size,
+            'enqueued': self.enqueued,
+            'written': self.written,
+            'flushes': self.flushes,
+            'sync_writes': self.sync_writes,
+            'retries': self.retries,
+            'errors': self.errors
+        }
+
+    def _ensure_worker(self):
+        with self._lock:
+            # A forked child inherits the queue but not the worker thread;
+            # a worker that died in this process is replaced on its queue
+            if self._queue is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._queue = queue.Queue(maxsize=self.queue_size)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, args=(self._queue,), name='activity-writer', daemon=True
+                )
+                self._thread.start()
+            return self._queue
+
+    def _run(self, work):
+        stopping = False
+        while not stopping:
+            item = work.get()
+            if item is _STOP:
+                work.task_done()
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = work.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    work.task_done()
+                    stopping = True
+                    break
+                batch.append(item)
+            try:
+                self._write(batch)
+            except Exception as e:
+                # Anything but a database error (a document BSON cannot
+                # encode, a bug) drops this batch and keeps the worker alive
+                self.errors += len(batch)
+                print(f"Activity log write failed: {str(e)}")
+            finally:
+                for _ in batch:
+                    work.task_done()
+
+    def _write(self, activities, sync=False):
+        # A retry resumes at the step that failed. Rows keep their _id and
+        # rollups remember the batches they counted, so a step that failed
+        # after partly succeeding can run again; a repeated version bump only
+        # ends an ETag early.
+        steps = (self._insert, record_rollups, self._bump_versions)
+        if self.mode == ASYNC:
+            steps = (self._drop_deleted_users,) + steps
+            # Filtered in place below, the caller keeps its list
+            activities = list(activities)
+        attempts = 1 if sync else self.write_retries + 1
+        done = 0
+        for attempt in range(attempts):
+            try:
+                while done < len(steps):
+                    steps[done](activities)
+                    done += 1
+                break
+            except PyMongoError as e:
+                if attempt + 1 < attempts:
+                    self.retries += 1
+                    time.sleep(RETRY_BACKOFF * 2 ** attempt)
+                    continue
+                self.errors += len(activities)
+                print(f"Activity log write failed: {str(e)}")
+                if sync and self.mode == SYNC:
+                    raise
+                return
+
+        self.written += len(activities)
+        if sync:
+            self.sync_writes += len(activities)
+        else:
+            self.flushes += 1
+
+    @staticmethod
+    def _insert(activities):
+        # insert_many gives each document its _id, so retrying after a
+        # partial insert only reports duplicates for the rows already stored
+        if not activities:
+            return
+        try:
+            mongo.db.activities.insert_many(list(activities), ordered=False)
+        except BulkWriteError as e:
+            details = e.details or {}
+            if details.get('writeConcernErrors') or any(
+                error.get('code') != 11000 for error in details.get('writeErrors', ())
+            ):
+                raise
+
+    @staticmethod
+    def _drop_deleted_users(activities):
+        # Queued events can outlive their account when it is deleted through
+        # another worker; their rows and rollups would never be cleaned up.
+        # Filters the batch in place so retries and the counters see it.
+        user_ids = list({a['user_id'] for a in activities if 'user_id' in a})
+        live = set(mongo.db.users.distinct('_id', {'_id': {'$in': user_ids}})) if user_ids else set()
+        activities[:] = [a for a in activities if a.get('user_id') in live]
+
+    @staticmethod
+    def _bump_versions(activities):
+        bump_versions(a['user_id'] for a in activities if 'user_id' in a)
+
+
+activity_log = ActivityWriter()
+atexit.register(activity_log.stop)
+
+
+def slim_activity_documents(batch_size=1000, dry_run=False):
+    # Rewrite activities that embed a full contact copy into the compact
+    # shape written by contact_activity(). Walks the collection in _id order
+    # so documents that cannot be slimmed further are never revisited.
+    query = {'contact': {'$type': 'object'}}
+    scanned = rewritten = bytes_saved = 0
+    last_id = None
+    while True:
+        batch_query = dict(query)
+        if last_id is not None:
+            batch_query['_id'] = {'$gt': last_id}
+        batch = list(mongo.db.activities.find(batch_query, {'contact': 1}).sort('_id', 1).limit(batch_size))
+        if not batch:
+            break
+        last_id = batch[-1]['_id']
+
+        updates = []
+        for activity in batch:
+            scanned += 1
+            old = activity['contact']
+            if '_id' not in old:
+                continue
+            new = contact_reference(old)
+            if new == old:
+                continue
+            bytes_saved += len(bson.encode({'contact': old})) - len(bson.encode({'contact': new}))
+            updates.append(UpdateOne({'_id': activity['_id']}, {'$set': {'contact': new}}))
+
+        if updates and not dry_run:
+            mongo.db.activities.bulk_write(updates, ordered=False)
+        rewritten += len(updates)
+
+    return {'scanned': scanned, 'rewritten': rewritten, 'bytes_saved': bytes_saved}
@@ -0,0 +1,412 @@
+import asyncio
+from datetime import datetime, timedelta
+from functools import wraps
+
+import jwt
+from a2wsgi import WSGIMiddleware
+from bson import ObjectId
+from pymongo import AsyncMongoClient
+from pymongo.errors import DuplicateKeyError
+from quart import Blueprint, Quart, current_app, jsonify, make_response, request
+from werkzeug.exceptions import MethodNotAllowed, NotFound
+
+from config import Config
+from app.activity import activity_log
+from app.cache import user_cache
+from app.contact_api import (CONTACT_PROJECTION, ContactPage, InvalidRequest, contact_created,
+                             contact_query, contacts_etag, new_contact, recent_activities,
+                             searched_activity, stats_body, stats_etag, wants_reconcile)
+from app.contact_cache import contact_cache
+from app.etag import with_etag
+from app.events import broker, notify_activities, subscribe
+from app.hash_pool import HashPoolSaturated
+from app.metrics import log_request, metrics, server_timing
+from app.mongo_pool import mongo_client_options
+from app.outbox import outbox
+from app.passwords import verify_and_upgrade
+from app.serialization import MongoJSONProvider
+from app.stats import (VERSIONS_PROJECTION, contacts_added_update, get_user_stats,
+                       prune_buckets_update, reconcile_user_stats, summarize_stats)
+
+
+class AsyncMongo:
+    # PyMongo's native asyncio client, created on first use inside the
+    # serving event loop and closed when the server shuts down
+
+    def __init__(self):
+        self.uri = None
+        self.options = {}
+        self.client = None
+        self.db = None
+
+    def init_app(self, app):
+        self.uri = app.config['MONGO_URI']
+        self.options = mongo_client_options(app.config)
+
+        @app.before_serving
+        async def connect():
+            self.connect()
+
+        @app.after_serving
+        async def close():
+            if self.client is not None:
+                await self.client.close()
+                self.client = self.db = None
+
+    def connect(self):
+        if self.client is None:
+            self.client = AsyncMongoClient(self.uri, **self.options)
+            self.db = self.client.get_default_database()
+        return self.db
+
+
+amongo = AsyncMongo()
+async_bp = Blueprint('async_api', __name__)
+
+
+def token_required(f=None, fresh=False):
+    # Same as the Flask decorator, fresh=True bypasses user_cache
+    if f is None:
+        return lambda view: token_required(view, fresh=fresh)
+
+    @wraps(f)
+    async def decorated(*args, **kwargs):
+        token = request.headers.get('Authorization')
+        if not token:
+            return jsonify({'error': 'Token is missing'}), 401
+        try:
+            data = jwt.decode(token.split()[1], Config.JWT_SECRET_KEY, algorithms=['HS256'])
+            current_user = None if fresh else user_cache.get(data['user_id'])
+            if current_user is None:
+                current_user = await amongo.connect().users.find_one({'_id': ObjectId(data['user_id'])})
+                if not current_user:
+                    user_cache.invalidate(data['user_id'])
+                    raise Exception('User not found')
+                user_cache.set(data['user_id'], current_user)
+        except Exception as e:
+            return jsonify({'error': 'Invalid token', 'details': str(e)}), 401
+        return await f(current_user, *args, **kwargs)
+    return decorated
+
+
+def not_modified(etag):
+    # Same as app.etag.not_modified, against the Quart request
+    if etag is not None and request.if_none_match.contains_weak(etag):
+        return with_etag(current_app.response_class('', status=304), etag)
+    return None
+
+
+async def record_activity(user_id, activity):
+    # Only a free queue slot is taken on the event loop. The synchronous log
+    # mode and a full queue (which waits and then writes inline) block, as
+    # do live dashboard pushes, so those go to a thread.
+    if not activity_log.record_nowait(activity):
+        await asyncio.to_thread(activity_log.record, activity)
+    if broker.has_subscribers(user_id):
+        await asyncio.to_thread(notify_activities, user_id, [activity])
+
+
+async def user_stats(db, user_id, reconcile=False):
+    doc = None if reconcile else await db.user_stats.find_one({'_id': user_id})
+    if doc is None or 'total_contacts' not in doc:
+        # Recounts are rare, reuse the sync implementation
+        return await asyncio.to_thread(get_user_stats, user_id, True)
+
+    stats, stale = summarize_stats(doc)
+    if stale:
+        await db.user_stats.update_one({'_id': user_id}, prune_buckets_update(stale))
+    return stats
+
+
+async def stats_snapshot(db, user_id, reconcile=False):
+    counters = await user_stats(db, user_id, reconcile=reconcile)
+    return stats_body(counters, await recent_activities(db, user_id).to_list())
+
+
+@async_bp.route('/api/login', methods=['POST'])
+async def login():
+    try:
+        data = await request.get_json()
+
+        if not data.get('email') or not data.get('password'):
+            return jsonify({'error': 'Email and password are required'}), 400
+
+        user = await amongo.connect().users.find_one({'email': data['email']})
+
+        # Hash checks block on the hashing pool, keep them off the event loop
+        if not user or not await asyncio.to_thread(verify_and_upgrade, user, data['password']):
+            return jsonify({'error': 'Invalid credentials'}), 401
+
+        token = jwt.encode(
+            {
+                'user_id': str(user['_id']),
+                'exp': datetime.utcnow() + timedelta(days=1)
+            },
+            Config.JWT_SECRET_KEY,
+            algorithm='HS256'
+        )
+
+        return jsonify({
+            'message': 'Login successful',
+            'token': token,
+            'user': {
+                'email': user['email'],
+                'name': user['name']
+            }
+        }), 200
+
+    except HashPoolSaturated as e:
+        response = jsonify({'error': 'Server is busy, please retry shortly'})
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response, 429
+    except Exception as e:
+        print(f"Login error: {str(e)}")
+        return jsonify({'error': 'Login failed', 'details': str(e)}), 500
+
+
+@async_bp.route('/api/verify-token', methods=['GET'])
+async def verify_token():
+    auth_header = request.headers.get('Authorization')
+    if not auth_header or 'Bearer' not in auth_header:
+        return jsonify({'error': 'Invalid token format'}), 401
+
+    token = auth_header.split(' ')[1]
+    try:
+        payload = jwt.decode(token, Config.JWT_SECRET_KEY, algorithms=['HS256'])
+        user = await amongo.connect().users.find_one({'_id': ObjectId(payload['user_id'])})
+        if not user:
+            raise Exception('User not found')
+
+        return jsonify({
+            'user': {
+                'email': user['email'],
+                'name': user['name']
+            }
+        }), 200
+    except jwt.ExpiredSignatureError:
+        return jsonify({'error': 'Token has expired'}), 401
+    except (jwt.InvalidTokenError, Exception):
+        return jsonify({'error': 'Invalid token'}), 401
+
+
+@async_bp.route('/api/contacts/stats', methods=['GET'])
+@token_required
+async def get_stats(current_user):
+    try:
+        db = amongo.connect()
+        user_id = current_user['_id']
+        reconcile = wants_reconcile(request.args)
+
+        etag = None
+        versions = None if reconcile else await db.user_stats.find_one({'_id': user_id}, VERSIONS_PROJECTION)
+        if versions is not None:
+            etag = stats_etag(user_id, versions)
+            cached = not_modified(etag)
+            if cached is not None:
+                return cached
+
+        response = jsonify(await stats_snapshot(db, user_id, reconcile=reconcile))
+        return with_etag(response, etag), 200
+    except Exception as e:
+        print(f"Error in get_stats: {str(e)}")
+        return jsonify({'error': 'Failed to get stats', 'details': str(e)}), 500
+
+
+@async_bp.route('/api/contacts/stats/stream', methods=['GET'])
+@token_required
+async def stream_stats(current_user):
+    # Open streams wait on the event loop instead of holding a thread
+    try:
+        user_id = current_user['_id']
+        subscription = subscribe(user_id, asynchronous=True)
+        if subscription is None:
+            return jsonify({'error': 'Too many open stats streams'}), 503
+
+        try:
+            snapshot = await stats_snapshot(amongo.connect(), user_id)
+        except Exception:
+            broker.unsubscribe(user_id, subscription)
+            raise
+        keepalive = current_app.config['STATS_STREAM_KEEPALIVE']
+        dumps = current_app.json.dumps
+
+        def sse(event, data):
+            return f"event: {event}\ndata: {dumps(data)}\n\n"
+
+        async def events():
+            try:
+                yield 'retry: 5000\n\n'
+                yield sse('snapshot', snapshot)
+                while True:
+                    try:
+                        event = await subscription.get(keepalive)
+                    except asyncio.TimeoutError:
+                        yield ': keepalive\n\n'
+                        continue
+                    yield sse('stats', event)
+            finally:
+                broker.unsubscribe(user_id, subscription)
+
+        response = await make_response(events(), 200, {
+            'Content-Type': 'text/event-stream',
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
+        # Streams stay open past Quart's RESPONSE_TIMEOUT
+        response.timeout = None
+        return response
+    except Exception as e:
+        print(f"Error in stream_stats: {str(e)}")
+        return jsonify({'error': 'Failed to open stats stream', 'details': str(e)}), 500
+
+
+@async_bp.route('/api/contacts', methods=['GET'])
+@token_required
+async def list_contacts(current_user):
+    try:
+        db = amongo.connect()
+        etag = None
+        versions = await db.user_stats.find_one({'_id': current_user['_id']}, VERSIONS_PROJECTION)
+        if versions is not None:
+            etag = contacts_etag(current_user['_id'], versions, request.full_path)
+            cached = not_modified(etag)
+            if cached is not None:
+                return cached
+
+        try:
+            page = ContactPage(current_user['_id'], request.args, current_app.config)
+        except InvalidRequest as e:
+            return jsonify({'error': str(e)}), 400
+
+        contacts = await page.cursor(db).to_list()
+        response = jsonify(page.body(contacts))
+        return with_etag(response, etag), 200
+    except Exception as e:
+        print(f"Error in list_contacts: {str(e)}")
+        return jsonify({'error': 'Failed to list contacts', 'details': str(e)}), 500
+
+
+@async_bp.route('/api/contacts', methods=['POST'])
+@token_required(fresh=True)
+async def create_contact(current_user):
+    try:
+        db = amongo.connect()
+        contact = new_contact(current_user['_id'], await request.get_json())
+
+        result = await db.contacts.insert_one(contact)
+        updated = await db.user_stats.update_one(
+            {'_id': current_user['_id']},
+            contacts_added_update(1, contact['created_at'])
+        )
+        if updated.matched_count == 0:
+            await asyncio.to_thread(reconcile_user_stats, current_user['_id'])
+
+        activity = contact_created(current_user['_id'], contact)
+        await contact_cache.put_async(current_user['_id'], contact)
+        await record_activity(current_user['_id'], activity)
+
+        return jsonify({'message': 'Contact created successfully', 'contact_id': str(result.inserted_id)}), 201
+    except DuplicateKeyError:
+        return jsonify({'error': 'Contact with this registration number already exists'}), 409
+    except Exception as e:
+        return jsonify({'error': 'Failed to create contact', 'details': str(e)}), 500
+
+
+@async_bp.route('/api/contacts/search', methods=['GET'])
+@token_required
+async def search_contacts(current_user):
+    try:
+        reg_number = request.args.get('registration_number')
+        if not reg_number:
+            return jsonify({'error': 'Registration number is required'}), 400
+
+        contact = await contact_cache.get_async(current_user['_id'], reg_number)
+        if contact is None:
+            contact = await amongo.connect().contacts.find_one(
+                contact_query(current_user['_id'], reg_number), CONTACT_PROJECTION
+            )
+
+            if not contact:
+                return jsonify({'error': 'Contact not found'}), 404
+            await contact_cache.put_async(current_user['_id'], contact)
+
+        activity = searched_activity(current_user['_id'], contact)
+        await record_activity(current_user['_id'], activity)
+
+        return jsonify(contact), 200
+    except Exception as e:
+        return jsonify({'error': 'Search failed', 'details': str(e)}), 500
+
+
+class RouteDispatcher:
+    # Sends requests for the ported routes to the async app and everything
+    # else (CORS preflights, imports, exports, account management) to the
+    # Flask app on a thread pool
+
+    def __init__(self, async_app, wsgi_app, wsgi_workers=10):
+        self.async_app = async_app
+        self.wsgi_app = wsgi_app
+        self.fallback = WSGIMiddleware(wsgi_app, workers=wsgi_workers)
+        self.urls = async_app.url_map.bind('')
+
+    def handles(self, scope):
+        if scope['type'] == 'lifespan':
+            return True
+        if scope['type'] != 'http' or scope['method'] == 'OPTIONS':
+            return False
+        try:
+            self.urls.match(scope['path'], method=scope['method'])
+        except (NotFound, MethodNotAllowed):
+            return False
+        return True
+
+    async def __call__(self, scope, receive, send):
+        if self.handles(scope):
+            await self.async_app(scope, receive, send)
+        else:
+            await self.fallback(scope, receive, send)
+
+
+def create_asgi_app(flask_app):
+    app = Quart(__name__)
+    app.config.from_mapping(flask_app.config)
+    app.json = MongoJSONProvider(app)
+    amongo.init_app(app)
+
+    app.register_blueprint(async_bp)
+
+    # Mail workers start with each serving process, like under serve.py
+    @app.before_serving
+    async def start_outbox():
+        outbox.ensure_started()
+
+    # Same instrumentation as the Flask app, with async hooks so the timing
+    # context lives in the request task
+    send_timing = app.config['SERVER_TIMING']
+
+    @app.before_request
+    async def start_timing():
+        metrics.start_request()
+
+    @app.after_request
+    async def finish_timing(response):
+        endpoint = request.endpoint or 'unmatched'
+        phases = metrics.finish_request(endpoint, request.method, response.status_code)
+        if phases is not None:
+            if send_timing:
+                response.headers['Server-Timing'] = server_timing(phases)
+            log_request(request.method, request.path, endpoint, response.status_code, phases)
+        return response
+
+    # Flask-CORS only sees the fallback responses
+    origins = set(app.config['CORS_ORIGINS'])
+
+    @app.after_request
+    async def add_cors_headers(response):
+        origin = request.headers.get('Origin')
+        if origin in origins:
+            response.headers['Access-Control-Allow-Origin'] = origin
+            response.headers.add('Vary', 'Origin')
+        return response
+
+    return RouteDispatcher(app, flask_app, app.config['ASGI_WSGI_WORKERS'])
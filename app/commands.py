@@ -0,0 +1,103 @@
+import click
+from app import mongo
+
+
+def register_commands(app):
+
+    @app.cli.command('ensure-indexes')
+    def ensure_indexes_command():
+        """Create the indexes used by the API routes."""
+        from app.indexes import ensure_indexes
+        from app.retention import retention_indexes
+
+        created, failed = ensure_indexes(mongo.db, extra=retention_indexes(app.config))
+        for collection, name in created:
+            click.echo(f"ok      {collection}.{name}")
+        for collection, name, error in failed:
+            click.echo(f"failed  {collection}.{name}: {error}")
+        if failed:
+            raise SystemExit(1)
+
+    @app.cli.command('check-query-plans')
+    def check_query_plans_command():
+        """Explain each route query and fail on any COLLSCAN."""
+        from app.indexes import verify_query_plans
+
+        results = verify_query_plans(mongo.db)
+        for route, collection, stages, ok in results:
+            status = 'ok' if ok else 'COLLSCAN'
+            click.echo(f"{status:<9} {collection:<11} {route}: {' > '.join(stages)}")
+        if not all(ok for *_, ok in results):
+            raise SystemExit(1)
+
+    @app.cli.command('backfill-search-keys')
+    @click.option('--batch-size', type=int, default=1000)
+    def backfill_search_keys_command(batch_size):
+        """Add prefix search keys to contacts that predate them."""
+        from app.search import backfill_search_keys
+
+        updated = backfill_search_keys(batch_size=batch_size)
+        click.echo(f"Updated {updated} contacts")
+
+    @app.cli.command('slim-activities')
+    @click.option('--batch-size', type=int, default=1000)
+    @click.option('--dry-run', is_flag=True, help='Report savings without writing.')
+    def slim_activities_command(batch_size, dry_run):
+        """Strip embedded contact copies from existing activities."""
+        from app.activity import slim_activity_documents
+
+        result = slim_activity_documents(batch_size=batch_size, dry_run=dry_run)
+        verb = 'Would rewrite' if dry_run else 'Rewrote'
+        click.echo(f"Scanned {result['scanned']} activities")
+        click.echo(f"{verb} {result['rewritten']} activities, {result['bytes_saved']} bytes saved")
+
+    @app.cli.command('backfill-rollups')
+    @click.option('--batch-size', type=int, default=1000)
+    def backfill_rollups_command(batch_size):
+        """Count activities that predate the daily rollups."""
+        from app.indexes import ensure_indexes
+        from app.retention import backfill_rollups, retention_indexes
+
+        counted = backfill_rollups(batch_size=batch_size)
+        click.echo(f"Counted {counted} activities into rollups")
+        # In TTL mode the expiry index waits for the backfill
+        if app.config.get('ACTIVITY_RETENTION_MODE') == 'ttl':
+            created, failed = ensure_indexes(mongo.db, extra=retention_indexes(app.config))
+            if failed:
+                raise SystemExit(1)
+            click.echo("Activity TTL index in place")
+
+    @app.cli.command('compact-activities')
+    @click.option('--days', type=int, default=None, help='Retention window (defaults to ACTIVITY_RETENTION_DAYS).')
+    @click.option('--archive-dir', default=None, help='Archive directory (defaults to ACTIVITY_ARCHIVE_DIR).')
+    @click.option('--batch-size', type=int, default=1000)
+    @click.option('--dry-run', is_flag=True, help='Count expired activities without deleting them.')
+    def compact_activities_command(days, archive_dir, batch_size, dry_run):
+        """Archive and delete activities past the retention window."""
+        from app.retention import compact_activities
+
+        result = compact_activities(
+            days if days is not None else app.config['ACTIVITY_RETENTION_DAYS'],
+            archive_dir=archive_dir or app.config.get('ACTIVITY_ARCHIVE_DIR'),
+            batch_size=batch_size,
+            dry_run=dry_run
+        )
+        if result['backfilled']:
+            click.echo(f"Counted {result['backfilled']} older activities into rollups")
+        click.echo(f"Activities older than {result['cutoff']}: {result['expired']}")
+        click.echo(f"Deleted {result['deleted']}")
+        if result['archive']:
+            click.echo(f"Archived to {result['archive']}")
+
+    @app.cli.command('mail-outbox')
+    @click.option('--workers', type=int, default=None, help='Worker threads (defaults to MAIL_OUTBOX_WORKERS).')
+    def mail_outbox_command(workers):
+        """Deliver queued mail in the foreground until interrupted."""
+        from app.outbox import outbox
+
+        outbox.start(workers=workers or max(outbox.workers, 1))
+        click.echo(f"Mail outbox running with {len(outbox._threads)} workers")
+        try:
+            outbox.join()
+        except KeyboardInterrupt:
+            outbox.stop()
@@ -0,0 +1,144 @@
+from datetime import datetime, timezone
+from pymongo import DESCENDING
+from app.activity import ACTIVITY_DISPLAY_PROJECTION, contact_activity
+from app.etag import make_etag
+from app.pagination import InvalidCursor, encode_cursor, keyset_filter
+from app.search import add_to_typeahead, search_keys
+from app.stats import recent_bucket_keys
+
+# Request parsing, queries and response bodies of the contact routes that
+# are served both by the Flask blueprint (app/routes/contacts.py) and by the
+# async app (app/asgi.py). The views only add the I/O, so the two cannot
+# drift apart. Query helpers return cursors that work with either client.
+
+# Fields a client may request through ?fields= on the contact listing
+CONTACT_FIELDS = ('registration_number', 'mobile', 'email', 'address', 'created_at')
+
+# Contacts are returned without their search keys
+CONTACT_PROJECTION = {'search_keys': 0}
+
+RECENT_ACTIVITIES_LIMIT = 4
+
+
+class InvalidRequest(ValueError):
+    # Answered with 400 and the message as the error
+    pass
+
+
+def wants_reconcile(args):
+    # ?reconcile=true forces a full recount of the stats counters
+    return args.get('reconcile', '').lower() in ('1', 'true', 'yes')
+
+
+def stats_etag(user_id, versions):
+    return make_etag('stats', user_id, versions.get('version', 0), *recent_bucket_keys(versions))
+
+
+def contacts_etag(user_id, versions, full_path):
+    return make_etag('contacts', user_id, versions.get('contacts_version', 0), full_path)
+
+
+def recent_activities(db, user_id):
+    return db.activities.find(
+        {'user_id': user_id},
+        ACTIVITY_DISPLAY_PROJECTION
+    ).sort('timestamp', -1).limit(RECENT_ACTIVITIES_LIMIT)
+
+
+def stats_body(counters, activities):
+    for activity in activities:
+        activity['type'] = activity['type'].replace('contact_', '')
+    return {
+        'total_contacts': counters['total_contacts'],
+        'recent_added': counters['recent_added'],
+        'recent_activities': activities
+    }
+
+
+class ContactPage:
+    # One GET /api/contacts request: page size, field projection and the
+    # keyset filter after the client's cursor, newest first
+
+    def __init__(self, user_id, args, config):
+        try:
+            limit = int(args.get('limit', config['CONTACTS_PAGE_SIZE']))
+        except ValueError:
+            raise InvalidRequest('limit must be an integer')
+        self.limit = max(1, min(limit, config['CONTACTS_MAX_PAGE_SIZE']))
+
+        fields = args.get('fields')
+        if fields:
+            fields = [f.strip() for f in fields.split(',') if f.strip()]
+            unknown = [f for f in fields if f not in CONTACT_FIELDS]
+            if unknown:
+                raise InvalidRequest(f"Unknown fields: {', '.join(unknown)}")
+        else:
+            fields = list(CONTACT_FIELDS)
+        self.fields = fields
+        self.projection = {field: 1 for field in fields}
+        self.projection['created_at'] = 1
+
+        try:
+            self.query = keyset_filter({'user_id': user_id}, args.get('cursor'))
+        except InvalidCursor:
+            raise InvalidRequest('Invalid cursor')
+
+    def cursor(self, db):
+        # One extra document tells whether there is a next page
+        return (db.contacts.find(self.query, self.projection)
+                .sort([('created_at', DESCENDING), ('_id', DESCENDING)])
+                .limit(self.limit + 1))
+
+    def body(self, contacts):
+        next_cursor = None
+        if len(contacts) > self.limit:
+            contacts = contacts[:self.limit]
+            next_cursor = encode_cursor(contacts[-1])
+
+        # created_at is always fetched for the cursor, drop it if not requested
+        if 'created_at' not in self.fields:
+            for contact in contacts:
+                del contact['created_at']
+        return {'contacts': contacts, 'next_cursor': next_cursor}
+
+
+def new_contact(user_id, data):
+    # Raises KeyError for a missing field
+    contact = {
+        'user_id': user_id,
+        'mobile': data['mobile'],
+        'email': data['email'],
+        'address': data['address'],
+        'registration_number': data['registration_number'],
+        'created_at': datetime.now(timezone.utc)
+    }
+    contact['search_keys'] = search_keys(contact)
+    return contact
+
+
+def contact_created(user_id, contact):
+    # In-process bookkeeping once the contact is stored; returns its activity.
+    # The views write the contact through to contact_cache themselves, the
+    # async one off the event loop.
+    add_to_typeahead(user_id, [contact])
+    return contact_activity(
+        user_id,
+        'contact_added',
+        f"Added contact with registration number {contact['registration_number']}",
+        contact,
+        datetime.now(timezone.utc)
+    )
+
+
+def contact_query(user_id, registration_number):
+    return {'user_id': user_id, 'registration_number': registration_number}
+
+
+def searched_activity(user_id, contact, timestamp=None):
+    return contact_activity(
+        user_id,
+        'contact_searched',
+        f"Searched for contact with registration number {contact['registration_number']}",
+        contact,
+        timestamp or datetime.now(timezone.utc)
+    )
@@ -0,0 +1,182 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import bson
+from app.cache import TTLCache
+
+MEMORY = 'memory'
+SQLITE = 'sqlite'
+
+
+def default_shared_path():
+    # Prefer a RAM-backed directory when the host has one
+    directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(directory, 'contacthub-contacts.sqlite')
+
+
+class SQLiteCache:
+    # Cache shared by the worker processes of one host through a SQLite
+    # file. Values are BSON so ObjectIds and datetimes survive the trip.
+    # Failures are counted and reported as misses, never raised.
+
+    PURGE_EVERY = 1000
+
+    def __init__(self, path, ttl=300):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def _connection(self):
+        # sqlite3 connections belong to one thread and must not cross a fork
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            local.connection = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            local.connection.execute('PRAGMA journal_mode=WAL')
+            local.connection.execute('PRAGMA synchronous=OFF')
+            local.connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache '
+                '(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)'
+            )
+            local.pid = os.getpid()
+        return local.connection
+
+    def get(self, key):
+        try:
+            row = self._connection().execute(
+                'SELECT value FROM cache WHERE key = ? AND expires_at > ?', (key, time.time())
+            ).fetchone()
+        except sqlite3.Error:
+            self.errors += 1
+            return None
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return bson.decode(row[0])
+
+    def set(self, key, value):
+        try:
+            connection = self._connection()
+            connection.execute(
+                'INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)',
+                (key, bson.encode(value), time.time() + self.ttl)
+            )
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                connection.execute('DELETE FROM cache WHERE expires_at <= ?', (time.time(),))
+        except sqlite3.Error:
+            self.errors += 1
+
+    def invalidate_prefix(self, prefix):
+        # Key range [prefix, prefix + U+FFFF) covers every key starting with it
+        try:
+            self._connection().execute(
+                'DELETE FROM cache WHERE key >= ? AND key < ?', (prefix, prefix + '\uffff')
+            )
+        except sqlite3.Error:
+            self.errors += 1
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'errors': self.errors}
+
+
+class ContactLookupCache:
+    # Contact documents by (user, registration number) for search_contacts.
+    # An in-process LRU answers repeat searches; the optional shared backend
+    # lets the other workers on the host reuse a lookup. Only found contacts
+    # are cached: contacts are never edited, create_contact writes new ones
+    # through and account deletion drops the user's entries (other workers'
+    # local copies expire with the TTL, like their user_cache entries).
+
+    def __init__(self):
+        self.local = TTLCache(maxsize=10000, ttl=300)
+        self.shared = None
+        self.lookups = 0
+
+    def configure(self, config):
+        self.local.maxsize = config.get('CONTACT_CACHE_SIZE', self.local.maxsize)
+        self.local.ttl = config.get('CONTACT_CACHE_TTL', self.local.ttl)
+        backend = config.get('CONTACT_CACHE_BACKEND', MEMORY)
+        if backend == SQLITE:
+            path = config.get('CONTACT_CACHE_PATH') or default_shared_path()
+            self.shared = SQLiteCache(path, ttl=self.local.ttl)
+        elif backend == MEMORY:
+            self.shared = None
+        else:
+            raise ValueError(f'Unknown CONTACT_CACHE_BACKEND: {backend}')
+
+    @staticmethod
+    def _key(user_id, registration_number):
+        return f'{user_id}:{registration_number}'
+
+    def get(self, user_id, registration_number):
+        # Returns a copy the caller may modify, or None
+        self.lookups += 1
+        key = self._key(user_id, registration_number)
+        contact = self.local.get(key)
+        if contact is None and self.shared is not None:
+            contact = self._get_shared(key)
+        return dict(contact) if contact is not None else None
+
+    async def get_async(self, user_id, registration_number):
+        # get() for event-loop callers: the LRU answers inline, the SQLite
+        # backend blocks (up to its busy timeout) and runs on a thread
+        self.lookups += 1
+        key = self._key(user_id, registration_number)
+        contact = self.local.get(key)
+        if contact is None and self.shared is not None:
+            contact = await asyncio.to_thread(self._get_shared, key)
+        return dict(contact) if contact is not None else None
+
+    def _get_shared(self, key):
+        contact = self.shared.get(key)
+        if contact is not None:
+            self.local.set(key, contact)
+        return contact
+
+    def put(self, user_id, contact):
+        key, contact = self._put_local(user_id, contact)
+        if self.shared is not None:
+            self.shared.set(key, contact)
+
+    async def put_async(self, user_id, contact):
+        key, contact = self._put_local(user_id, contact)
+        if self.shared is not None:
+            await asyncio.to_thread(self.shared.set, key, contact)
+
+    def _put_local(self, user_id, contact):
+        # Stores the contact as search_contacts returns it; the BSON round
+        # trip gives written-through documents the same millisecond, naive
+        # UTC datetimes a read from Mongo would
+        contact = bson.decode(bson.encode({k: v for k, v in contact.items() if k != 'search_keys'}))
+        key = self._key(user_id, contact['registration_number'])
+        self.local.set(key, contact)
+        return key, contact
+
+    def invalidate_user(self, user_id):
+        prefix = f'{user_id}:'
+        self.local.invalidate_where(lambda key: key.startswith(prefix))
+        if self.shared is not None:
+            self.shared.invalidate_prefix(prefix)
+
+    def stats(self):
+        local = self.local.stats()
+        stats = {
+            'lookups': self.lookups,
+            'local': local,
+            'shared': self.shared.stats() if self.shared is not None else None,
+        }
+        hits = local['hits'] + (self.shared.hits if self.shared is not None else 0)
+        stats['mongo_lookups'] = self.lookups - hits
+        stats['hit_ratio'] = round(hits / self.lookups, 4) if self.lookups else 0.0
+        return stats
+
+
+contact_cache = ContactLookupCache()
@@ -0,0 +1,284 @@
+import re
+import threading
+from markupsafe import escape
+
+# HTML email template
+EMAIL_TEMPLATE = """
+<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <style>
+        @import url('https://fonts.googleapis.com/css2?family=Orbitron:wght@400;500;600&display=swap');
+        
+        * {
+            margin: 0;
+            padding: 0;
+            box-sizing: border-box;
+        }
+        
+        body {
+            font-family: 'Orbitron', sans-serif;
+            background: #1e1e1e;
+            margin: 0;
+            padding: 16px;
+            color: white;
+            -webkit-font-smoothing: antialiased;
+            -moz-osx-font-smoothing: grayscale;
+        }
+        
+        .container {
+            max-width: 600px;
+            margin: 0 auto;
+            background: #222222;
+            border-radius: 12px;
+            overflow: hidden;
+            box-shadow: 0 4px 24px rgba(0, 0, 0, 0.2);
+        }
+        
+        .header {
+            background: #1a1a1a;
+            padding: 24px;
+            border-bottom: 1px solid #333;
+        }
+        
+        .logo-container {
+            display: flex;
+            align-items: center;
+            gap: 12px;
+        }
+        
+        .logo-circle {
+            width: 32px;
+            height: 32px;
+            background: #f97316;
+            border-radius: 50%;
+            flex-shrink: 0;
+        }
+        
+        .logo-text {
+            font-size: 24px;
+            font-weight: 600;
+            color: white;
+            letter-spacing: 0.5px;
+        }
+        
+        .content {
+            padding: 32px 24px;
+        }
+        
+        .title {
+            font-size: 36px;
+            font-weight: 600;
+            color: white;
+            margin-bottom: 16px;
+            line-height: 1.2;
+            letter-spacing: -0.5px;
+        }
+        
+        .description {
+            color: #e0e0e0;
+            margin-bottom: 32px;
+            font-size: 16px;
+            line-height: 1.5;
+        }
+        
+        .button-container {
+            padding: 0 12px;
+            margin-bottom: 32px;
+        }
+        
+        .button {
+            display: block;
+            width: 100%;
+            background: #f97316;
+            color: white;
+            padding: 16px 24px;
+            text-align: center;
+            border-radius: 8px;
+            text-decoration: none;
+            font-weight: 500;
+            font-size: 16px;
+            transition: background-color 0.2s ease;
+            box-shadow: 0 2px 8px rgba(249, 115, 22, 0.2);
+        }
+        
+        .button:hover {
+            background: #ea580c;
+        }
+        
+        .footer {
+            border-top: 1px solid #333;
+            padding: 24px;
+            background: #1a1a1a;
+        }
+        
+        .footer p {
+            color: #888;
+            font-size: 14px;
+            line-height: 1.6;
+            margin-bottom: 8px;
+        }
+        
+        .footer p:last-child {
+            margin-bottom: 0;
+        }
+        
+        .footer a {
+            color: #f97316;
+            text-decoration: none;
+            transition: color 0.2s ease;
+        }
+        
+        .footer a:hover {
+            color: #ea580c;
+        }
+        
+        @media (max-width: 600px) {
+            body {
+                padding: 8px;
+            }
+            
+            .container {
+                border-radius: 8px;
+            }
+            
+            .header {
+                padding: 20px 16px;
+            }
+            
+            .content {
+                padding: 24px 16px;
+            }
+            
+            .title {
+                font-size: 28px;
+                margin-bottom: 12px;
+            }
+            
+            .description {
+                font-size: 15px;
+                margin-bottom: 24px;
+            }
+            
+            .button-container {
+                padding: 0 8px;
+                margin-bottom: 24px;
+            }
+            
+            .footer {
+                padding: 20px 16px;
+            }
+            
+            .logo-text {
+                font-size: 20px;
+            }
+            
+            .logo-circle {
+                width: 28px;
+                height: 28px;
+            }
+        }
+        
+        @media (max-width: 400px) {
+            .title {
+                font-size: 24px;
+            }
+            
+            .button {
+                padding: 14px 20px;
+                font-size: 15px;
+            }
+        }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <div class="logo-container">
+                <div class="logo-circle"></div>
+                <div class="logo-text">ContactHub X50</div>
+            </div>
+        </div>
+        
+        <div class="content">
+            <h1 class="title">Password Reset Request</h1>
+            <p class="description">We received a request to reset your password. Click the button below to create a new password for your ContactHub X50 account.</p>
+            
+            <div class="button-container">
+                <a href="{{ reset_link }}" class="button">
+                    Reset Your Password
+                </a>
+            </div>
+        </div>
+        
+        <div class="footer">
+            <p><strong>Important:</strong> If you didn't request a password reset, please ignore this email and ensure your account is secure by logging in to change your password.</p>
+            <p>If you're experiencing issues, please contact <a href="#">Support</a>.</p>
+            <p>This password reset link will expire in 20 minutes for security purposes.</p>
+        </div>
+    </div>
+</body>
+</html>
+"""
+
+# Plaintext alternative for clients that do not render HTML
+TEXT_TEMPLATE = """
+ContactHub X50 Password Reset Request
+
+All you have to do is click this link and we'll sign you in securely:
+{{ reset_link }}
+
+If you didn't request this email, you can safely ignore it.
+If you're experiencing issues, please contact support.
+
+This link will expire in 20 minutes.
+"""
+
+PLACEHOLDER = '{{ reset_link }}'
+
+_STYLE_BLOCK = re.compile(r'(<style>)(.*?)(</style>)', re.S)
+
+
+def minify_css(css):
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{}:;,>])\s*', r'\1', css)
+    css = css.replace(';}', '}')
+    return css.strip()
+
+
+class ResetEmailTemplate:
+    # The reset email only varies by its link, so the template is split
+    # once around the placeholder and each render is an escape plus a join
+    # instead of a Jinja parse/compile of the whole document.
+
+    def __init__(self, html_source, text_source):
+        html_source = _STYLE_BLOCK.sub(
+            lambda m: m.group(1) + minify_css(m.group(2)) + m.group(3), html_source
+        )
+        self.html_parts = html_source.split(PLACEHOLDER)
+        self.text_parts = text_source.split(PLACEHOLDER)
+
+    def render(self, reset_link):
+        html = str(escape(reset_link)).join(self.html_parts)
+        body = reset_link.join(self.text_parts)
+        return html, body
+
+
+_template = None
+_template_lock = threading.Lock()
+
+
+def get_reset_email_template():
+    global _template
+    if _template is None:
+        with _template_lock:
+            if _template is None:
+                _template = ResetEmailTemplate(EMAIL_TEMPLATE, TEXT_TEMPLATE)
+    return _template
+
+
+def render_reset_email(reset_link):
+    return get_reset_email_template().render(reset_link)
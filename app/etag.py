@@ -0,0 +1,22 @@
+import hashlib
+from flask import current_app, request
+
+
+def make_etag(*parts):
+    return hashlib.sha1(':'.join(str(part) for part in parts).encode()).hexdigest()[:24]
+
+
+def not_modified(etag):
+    # 304 response when the client already holds this representation
+    if etag is not None and request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+        return with_etag(response, etag)
+    return None
+
+
+def with_etag(response, etag):
+    if etag is not None:
+        response.set_etag(etag, weak=True)
+        # Let browsers keep the body but revalidate on every use
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,252 @@
+import asyncio
+import os
+import queue
+import threading
+from collections import defaultdict
+from pymongo.errors import PyMongoError
+from app import mongo
+from app.contact_api import recent_activities
+from app.stats import get_user_stats
+
+LOCAL = 'local'
+POLL = 'poll'
+CHANGE_STREAM = 'changestream'
+
+
+class Subscription(queue.Queue):
+    # Updates for a stream served by a request thread
+
+    def offer(self, event):
+        # Never blocks: drop the oldest update when the stream falls behind
+        while True:
+            try:
+                self.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self.get_nowait()
+                except queue.Empty:
+                    pass
+
+
+class AsyncSubscription:
+    # Updates for a stream served by a coroutine. Publishers run on request
+    # and relay threads, so events are handed to the stream's event loop.
+
+    def __init__(self, maxsize):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+
+    def offer(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self._offer, event)
+        except RuntimeError:
+            # The loop has shut down, the stream is gone
+            pass
+
+    def _offer(self, event):
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class StatsBroker:
+    # In-process pub/sub of dashboard stats updates, one bounded queue per
+    # open stream. Publishing never blocks: a subscriber that falls behind
+    # loses its oldest update, the next one carries the current counters.
+    #
+    # A threaded stream holds a server thread for as long as it is open, so
+    # those are capped at max_threaded, well below the threads of a worker;
+    # beyond that clients get 503 and poll. Streams served from the event
+    # loop (ASGI mode) only count against max_subscribers.
+
+    def __init__(self, queue_size=16, max_subscribers=500, max_threaded=1):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.max_threaded = max_threaded
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+        self._count = 0
+        self._threaded = 0
+
+    def subscribe(self, user_id, asynchronous=False):
+        # Call from the event loop when asynchronous
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                return None
+            if asynchronous:
+                q = AsyncSubscription(self.queue_size)
+            elif self._threaded >= self.max_threaded:
+                return None
+            else:
+                q = Subscription(maxsize=self.queue_size)
+                self._threaded += 1
+            self._subscribers[user_id].add(q)
+            self._count += 1
+            return q
+
+    def unsubscribe(self, user_id, q):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers and q in subscribers:
+                subscribers.discard(q)
+                self._count -= 1
+                if isinstance(q, Subscription):
+                    self._threaded -= 1
+                if not subscribers:
+                    del self._subscribers[user_id]
+
+    def has_subscribers(self, user_id):
+        return user_id in self._subscribers
+
+    def users(self):
+        with self._lock:
+            return list(self._subscribers)
+
+    def publish(self, user_id, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for q in subscribers:
+            q.offer(event)
+
+    def stats(self):
+        return {'subscribers': self._count, 'threaded': self._threaded, 'users': len(self._subscribers)}
+
+
+def display_activity(activity):
+    return {
+        '_id': activity.get('_id'),
+        'type': activity.get('type', '').replace('contact_', ''),
+        'details': activity.get('details'),
+        'timestamp': activity.get('timestamp'),
+        'contact': activity.get('contact')
+    }
+
+
+def stats_event(user_id, activities):
+    # Current counters plus the activities that triggered the update,
+    # newest first
+    counters = get_user_stats(user_id)
+    recent = sorted(activities, key=lambda a: a['timestamp'], reverse=True)[:4]
+    return {**counters, 'activities': [display_activity(a) for a in recent]}
+
+
+class ChangeStreamRelay:
+    # Publishes activity inserts from every process to local subscribers by
+    # tailing a MongoDB change stream (replica set or sharded cluster only).
+    # Inserts are grouped per user for each batch the stream returns, so a
+    # bulk import produces one update per user rather than one per row.
+
+    def __init__(self, broker):
+        self.broker = broker
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='stats-change-stream', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        pipeline = [{'$match': {'operationType': 'insert'}}]
+        while True:
+            try:
+                with mongo.db.activities.watch(pipeline, max_await_time_ms=1000) as stream:
+                    while stream.alive:
+                        pending = defaultdict(list)
+                        change = stream.try_next()
+                        while change is not None:
+                            activity = change['fullDocument']
+                            if self.broker.has_subscribers(activity.get('user_id')):
+                                pending[activity['user_id']].append(activity)
+                            change = stream.try_next()
+                        for user_id, activities in pending.items():
+                            self.broker.publish(user_id, stats_event(user_id, activities))
+            except PyMongoError as e:
+                print(f"Stats change stream error: {str(e)}")
+                threading.Event().wait(5)
+
+
+class VersionPoller:
+    # Publishes writes of every process without a replica set: once per
+    # interval the user_stats versions of all users watched in this process
+    # are read in one query, and each user whose version moved gets its
+    # current counters and latest activities. A user's first reading only
+    # sets the baseline, the stream has just sent its snapshot.
+
+    def __init__(self, broker, interval=2.0):
+        self.broker = broker
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='stats-version-poller', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        seen = {}
+        wait = threading.Event().wait
+        while True:
+            wait(self.interval)
+            users = self.broker.users()
+            seen = {user_id: seen[user_id] for user_id in users if user_id in seen}
+            if not users:
+                continue
+            try:
+                for doc in mongo.db.user_stats.find({'_id': {'$in': users}}, {'version': 1}):
+                    user_id, version = doc['_id'], doc.get('version', 0)
+                    previous = seen.get(user_id)
+                    seen[user_id] = version
+                    if previous is not None and version != previous:
+                        activities = list(recent_activities(mongo.db, user_id))
+                        self.broker.publish(user_id, stats_event(user_id, activities))
+            except PyMongoError as e:
+                print(f"Stats version poll error: {str(e)}")
+
+
+broker = StatsBroker()
+relay = ChangeStreamRelay(broker)
+poller = VersionPoller(broker)
+backend = LOCAL
+
+
+def configure_events(config):
+    global backend
+    backend = config.get('STATS_EVENTS_BACKEND', backend)
+    poller.interval = config.get('STATS_EVENTS_POLL_INTERVAL', poller.interval)
+    broker.queue_size = config.get('STATS_STREAM_QUEUE_SIZE', broker.queue_size)
+    broker.max_subscribers = config.get('STATS_STREAM_MAX_CONNECTIONS', broker.max_subscribers)
+    broker.max_threaded = config.get('STATS_STREAM_MAX_THREADED', broker.max_threaded)
+
+
+def subscribe(user_id, asynchronous=False):
+    if backend == POLL:
+        poller.start()
+    elif backend == CHANGE_STREAM:
+        relay.start()
+    return broker.subscribe(user_id, asynchronous)
+
+
+def notify_activities(user_id, activities):
+    # Called by the write paths; a no-op when nobody in this process is
+    # watching the user's dashboard or when the poller or change stream
+    # publishes instead
+    if backend != LOCAL or not activities or not broker.has_subscribers(user_id):
+        return
+    try:
+        broker.publish(user_id, stats_event(user_id, activities))
+    except PyMongoError as e:
+        print(f"Stats notify error: {str(e)}")
@@ -0,0 +1,70 @@
+import csv
+import io
+import json
+from datetime import datetime, timezone
+from bson import ObjectId
+from pymongo import ASCENDING, ReadPreference
+from app import mongo
+
+# Columns written for each exportable collection. Nested contact fields on
+# activities are flattened with a dotted name.
+EXPORT_FIELDS = {
+    'contacts': ['_id', 'registration_number', 'mobile', 'email', 'address', 'created_at'],
+    'activities': ['_id', 'type', 'details', 'timestamp', 'contact._id', 'contact.registration_number'],
+}
+SORT_FIELDS = {
+    'contacts': 'created_at',
+    'activities': 'timestamp',
+}
+
+
+def _plain(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.isoformat()
+    return value
+
+
+def _field(document, name):
+    for part in name.split('.'):
+        if not isinstance(document, dict):
+            return None
+        document = document.get(part)
+    return _plain(document)
+
+
+def export_cursor(collection, user_id, batch_size):
+    # Exports may read from a secondary so they stay off the primary that
+    # serves interactive requests; single-node deployments fall back to it.
+    coll = mongo.db[collection].with_options(read_preference=ReadPreference.SECONDARY_PREFERRED)
+    projection = {name: 1 for name in EXPORT_FIELDS[collection]}
+    return coll.find({'user_id': user_id}, projection) \
+        .sort(SORT_FIELDS[collection], ASCENDING) \
+        .batch_size(batch_size)
+
+
+def iter_ndjson(cursor, collection):
+    fields = EXPORT_FIELDS[collection]
+    for document in cursor:
+        yield json.dumps({name: _field(document, name) for name in fields}) + '\n'
+
+
+def iter_csv(cursor, collection, rows_per_chunk=100):
+    # Rows are buffered in a small StringIO and flushed every rows_per_chunk
+    fields = EXPORT_FIELDS[collection]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    pending = 0
+    for document in cursor:
+        writer.writerow([_field(document, name) for name in fields])
+        pending += 1
+        if pending >= rows_per_chunk:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue()
@@ -0,0 +1,180 @@
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from app.metrics import metrics
+
+
+class HashPoolSaturated(Exception):
+    # Raised instead of queueing when every admission slot is taken
+
+    def __init__(self, retry_after):
+        super().__init__('Password hashing capacity exhausted')
+        self.retry_after = retry_after
+
+
+def _timed(fn, args):
+    # Runs in the pool; reports when it started so the caller can tell
+    # queue wait from execution time
+    started = time.time()
+    result = fn(*args)
+    return result, started, time.time() - started
+
+
+class HashingService:
+    # Runs password hashing on a dedicated pool so CPU-bound work cannot
+    # starve request threads. At most `workers + max_queue` jobs are admitted
+    # per process; callers beyond that wait up to admission_timeout and then
+    # get HashPoolSaturated, which routes turn into 429 + Retry-After, as do
+    # jobs that outlast `timeout`.
+    #
+    # kind='process' uses a forkserver/spawn process pool, 'thread' a thread
+    # pool (hashlib and bcrypt release the GIL), and workers=0 hashes inline.
+    # A process pool whose child died is replaced and the job retried once.
+
+    def __init__(self, kind='process', workers=2, max_queue=8, admission_timeout=0.05, timeout=10.0):
+        self.kind = kind
+        self.workers = workers
+        self.max_queue = max_queue
+        self.admission_timeout = admission_timeout
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._executor = None
+        self._slots = None
+        self._pid = None
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.restarts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.exec_total = 0.0
+        self.exec_max = 0.0
+
+    def configure(self, config):
+        self.shutdown()
+        self.kind = config.get('HASH_POOL_KIND', self.kind)
+        self.workers = config.get('HASH_POOL_WORKERS', self.workers)
+        self.max_queue = config.get('HASH_POOL_MAX_QUEUE', self.max_queue)
+        self.admission_timeout = config.get('HASH_POOL_ADMISSION_TIMEOUT', self.admission_timeout)
+        self.timeout = config.get('HASH_POOL_TIMEOUT', self.timeout)
+        self._slots = None
+        if self.kind not in ('process', 'thread'):
+            raise ValueError(f'Unknown HASH_POOL_KIND: {self.kind}')
+
+    def _ensure_pool(self):
+        with self._lock:
+            # Pools do not survive a fork, build a new one in the child
+            if self._executor is None or self._pid != os.getpid():
+                # Admission slots outlive a replaced executor, callers hold them
+                if self._slots is None or self._pid != os.getpid():
+                    self._slots = threading.BoundedSemaphore(self.workers + self.max_queue)
+                self._pid = os.getpid()
+                if self.kind == 'thread':
+                    self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='hash-pool')
+                else:
+                    methods = multiprocessing.get_all_start_methods()
+                    context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+                    self._executor = ProcessPoolExecutor(self.workers, mp_context=context)
+            return self._executor, self._slots
+
+    def run(self, fn, *args):
+        with metrics.phase('hash'):
+            return self._run(fn, *args)
+
+    def _run(self, fn, *args):
+        if self.workers <= 0:
+            return fn(*args)
+
+        executor, slots = self._ensure_pool()
+        self._admit(slots)
+        submitted = time.time()
+        self.submitted += 1
+        try:
+            try:
+                future = self._submit(executor, slots, fn, args)
+                result, started, elapsed = future.result(timeout=self.timeout)
+            except BrokenProcessPool:
+                # A child was killed (OOM, segfault); the executor refuses
+                # all work from then on. The failed job has freed its slot.
+                self._replace(executor)
+                executor, slots = self._ensure_pool()
+                self._admit(slots)
+                future = self._submit(executor, slots, fn, args)
+                result, started, elapsed = future.result(timeout=self.timeout)
+        except TimeoutError:
+            # The job keeps its slot until it finishes, so an overrunning
+            # pool turns into 429s rather than admitting more work
+            future.cancel()
+            self.timeouts += 1
+            raise HashPoolSaturated(self.retry_after())
+
+        waited = max(started - submitted, 0.0)
+        self.completed += 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+        self.exec_total += elapsed
+        self.exec_max = max(self.exec_max, elapsed)
+        return result
+
+    def _admit(self, slots):
+        if not slots.acquire(timeout=self.admission_timeout):
+            self.rejected += 1
+            raise HashPoolSaturated(self.retry_after())
+
+    @staticmethod
+    def _submit(executor, slots, fn, args):
+        # The slot is released when the job is done, not when its caller
+        # stops waiting: a job past the timeout still occupies a worker
+        try:
+            future = executor.submit(_timed, fn, args)
+        except BaseException:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+        return future
+
+    def _replace(self, executor):
+        # Drop a broken executor; the next _ensure_pool builds a new one.
+        # Threads that hit the same failure only replace it once.
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+            self.restarts += 1
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def retry_after(self):
+        # Seconds until a full queue has likely drained
+        average = self.exec_total / self.completed if self.completed else 0.25
+        return max(1, math.ceil(average * (self.workers + self.max_queue) / max(self.workers, 1)))
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None and self._pid == os.getpid():
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        completed = self.completed or 1
+        return {
+            'kind': self.kind,
+            'workers': self.workers,
+            'max_queue': self.max_queue,
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'rejected': self.rejected,
+            'timeouts': self.timeouts,
+            'restarts': self.restarts,
+            'queue_wait_avg_ms': round(self.wait_total / completed * 1000, 3),
+            'queue_wait_max_ms': round(self.wait_max * 1000, 3),
+            'exec_avg_ms': round(self.exec_total / completed * 1000, 3),
+            'exec_max_ms': round(self.exec_max * 1000, 3)
+        }
+
+
+hash_service = HashingService()
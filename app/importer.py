@@ -0,0 +1,138 @@
+import csv
+import io
+import json
+import time
+from datetime import datetime, timezone
+from pymongo.errors import BulkWriteError
+from app import mongo
+from app.stats import record_contacts_added
+from app.activity import activity_log, contact_activity
+from app.search import add_to_typeahead, search_keys
+from app.events import notify_activities
+
+CONTACT_FIELDS = ('mobile', 'email', 'address', 'registration_number')
+DUPLICATE_KEY = 11000
+
+
+def iter_csv_rows(stream):
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    for row_number, row in enumerate(reader, start=1):
+        yield row_number, row, None
+
+
+def iter_ndjson_rows(stream):
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig')
+    for row_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield row_number, None, f'Invalid JSON: {str(e)}'
+            continue
+        if not isinstance(row, dict):
+            yield row_number, None, 'Row must be a JSON object'
+            continue
+        yield row_number, row, None
+
+
+def validate_row(row):
+    contact = {}
+    for field in CONTACT_FIELDS:
+        value = row.get(field)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = str(value)
+        if not isinstance(value, str) or not value.strip():
+            return None, f'Missing required field: {field}'
+        contact[field] = value.strip()
+    return contact, None
+
+
+class ContactImport:
+    # Streams rows from a CSV or NDJSON upload into `contacts` in chunks.
+    # Each chunk is one unordered insert_many for the contacts plus one for
+    # their activities, so a bad row never aborts the rest of its chunk.
+
+    def __init__(self, user_id, chunk_size=1000, max_errors=1000):
+        self.user_id = user_id
+        self.chunk_size = chunk_size
+        self.max_errors = max_errors
+        self.rows = 0
+        self.inserted = 0
+        self.failed = 0
+        self.errors = []
+
+    def _error(self, row_number, message):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'row': row_number, 'error': message})
+
+    def run(self, rows):
+        started = time.perf_counter()
+        chunk = []
+        for row_number, row, error in rows:
+            self.rows += 1
+            if error is None:
+                contact, error = validate_row(row)
+            if error is not None:
+                self._error(row_number, error)
+                continue
+            chunk.append((row_number, contact))
+            if len(chunk) >= self.chunk_size:
+                self._flush(chunk)
+                chunk = []
+        if chunk:
+            self._flush(chunk)
+        elapsed = time.perf_counter() - started
+        return self.report(elapsed)
+
+    def _flush(self, chunk):
+        now = datetime.now(timezone.utc)
+        documents = [
+            {'user_id': self.user_id, **contact, 'search_keys': search_keys(contact), 'created_at': now}
+            for _, contact in chunk
+        ]
+
+        rejected = {}
+        try:
+            mongo.db.contacts.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            for write_error in e.details.get('writeErrors', []):
+                if write_error.get('code') == DUPLICATE_KEY:
+                    message = 'Contact with this registration number already exists'
+                else:
+                    message = write_error.get('errmsg', 'Insert failed')
+                rejected[write_error['index']] = message
+
+        activities = []
+        inserted = []
+        for index, ((row_number, contact), document) in enumerate(zip(chunk, documents)):
+            if index in rejected:
+                self._error(row_number, rejected[index])
+                continue
+            inserted.append(document)
+            activities.append(contact_activity(
+                self.user_id,
+                'contact_added',
+                f"Added contact with registration number {contact['registration_number']}",
+                document,
+                now
+            ))
+
+        if activities:
+            activity_log.record_many(activities)
+            record_contacts_added(self.user_id, count=len(activities), created_at=now)
+            add_to_typeahead(self.user_id, inserted)
+            notify_activities(self.user_id, activities[-4:])
+            self.inserted += len(activities)
+
+    def report(self, elapsed):
+        return {
+            'rows': self.rows,
+            'inserted': self.inserted,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors),
+            'elapsed_seconds': round(elapsed, 3),
+            'rows_per_second': round(self.rows / elapsed, 1) if elapsed > 0 else None
+        }
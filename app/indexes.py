@@ -0,0 +1,85 @@
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import ConnectionFailure, PyMongoError
+from app.search import prefix_keys, prefix_query
+
+# Indexes backing every hot query. Each entry is
+# (collection, keys, options) and is passed straight to create_index.
+INDEXES = [
+    ('users', [('email', ASCENDING)], {'name': 'email_1', 'unique': True}),
+    ('contacts', [('user_id', ASCENDING), ('registration_number', ASCENDING)],
+     {'name': 'user_registration_number', 'unique': True}),
+    ('contacts', [('user_id', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)],
+     {'name': 'user_created_at_id'}),
+    ('contacts', [('user_id', ASCENDING), ('search_keys', ASCENDING)],
+     {'name': 'user_search_keys'}),
+    ('activities', [('user_id', ASCENDING), ('timestamp', DESCENDING)],
+     {'name': 'user_timestamp'}),
+    ('mail_outbox', [('status', ASCENDING), ('next_attempt_at', ASCENDING)],
+     {'name': 'status_next_attempt_at'}),
+]
+
+
+def ensure_indexes(db, extra=()):
+    # create_index is a no-op when an identical index already exists
+    created, failed = [], []
+    for collection, keys, options in [*INDEXES, *extra]:
+        try:
+            created.append((collection, db[collection].create_index(keys, **options)))
+        except ConnectionFailure as e:
+            # No point trying the rest against an unreachable server
+            print(f"Index creation skipped, MongoDB unreachable: {str(e)}")
+            failed.append((collection, options['name'], str(e)))
+            break
+        except PyMongoError as e:
+            print(f"Index creation failed on {collection} {keys}: {str(e)}")
+            failed.append((collection, options['name'], str(e)))
+    return created, failed
+
+
+def route_queries():
+    # Representative shapes of the queries issued by the routes. Values are
+    # placeholders; only the shape matters to the planner.
+    user_id = ObjectId()
+    return [
+        ('login / register / forgot_password', 'users',
+         lambda db: db.users.find({'email': 'user@example.com'})),
+        ('token_required', 'users',
+         lambda db: db.users.find({'_id': user_id})),
+        ('search_contacts', 'contacts',
+         lambda db: db.contacts.find({'user_id': user_id, 'registration_number': 'REG-0001'})),
+        ('lookup_contacts', 'contacts',
+         lambda db: db.contacts.find({'user_id': user_id, 'registration_number': {'$in': ['REG-0001', 'REG-0002']}})),
+        ('get_stats: contact count', 'contacts',
+         lambda db: db.contacts.find({'user_id': user_id})),
+        ('get_stats: recent additions', 'contacts',
+         lambda db: db.contacts.find({'user_id': user_id, 'created_at': {'$gte': user_id.generation_time}})),
+        ('suggest_contacts', 'contacts',
+         lambda db: db.contacts.find(prefix_query(user_id, prefix_keys('KCA1'))).limit(10)),
+        ('list_contacts', 'contacts',
+         lambda db: db.contacts.find({'user_id': user_id}).sort([('created_at', DESCENDING), ('_id', DESCENDING)]).limit(50)),
+        ('get_stats: recent activities', 'activities',
+         lambda db: db.activities.find({'user_id': user_id}).sort('timestamp', DESCENDING).limit(4)),
+    ]
+
+
+def _plan_stages(plan):
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            yield plan['stage']
+        for value in plan.values():
+            yield from _plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _plan_stages(item)
+
+
+def verify_query_plans(db):
+    # Returns [(route, collection, stages, ok)] for each route query
+    results = []
+    for route, collection, build in route_queries():
+        explain = build(db).explain()
+        winning_plan = explain.get('queryPlanner', {}).get('winningPlan', {})
+        stages = list(_plan_stages(winning_plan))
+        results.append((route, collection, stages, 'COLLSCAN' not in stages))
+    return results
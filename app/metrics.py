@@ -0,0 +1,279 @@
+import contextvars
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from pymongo import monitoring
+
+# Upper bounds (seconds) of every latency histogram
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+request_log = logging.getLogger('contacthub.requests')
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            yield bound, total
+
+
+class RequestTiming:
+    __slots__ = ('started', 'phases', 'mongo_ops')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.mongo_ops = 0
+
+    def add(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+
+# Timing of the request being handled by this thread or task
+_current = contextvars.ContextVar('request_timing', default=None)
+
+
+class CommandTimer(monitoring.CommandListener):
+    # Command events are published on the thread (or task) that ran the
+    # command, so their durations add up to the Mongo time of the request
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._add(event.duration_micros)
+
+    def failed(self, event):
+        self._add(event.duration_micros)
+
+    def _add(self, micros):
+        timing = _current.get()
+        if timing is not None:
+            timing.add('mongo', micros / 1e6)
+            timing.mongo_ops += 1
+
+
+command_timer = CommandTimer()
+
+
+class Metrics:
+    # Per-process request latency histograms, time per phase (Mongo,
+    # password hashing, the rest is Python) and named timers for work done
+    # outside requests such as mail delivery
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = defaultdict(Histogram)
+        self.responses = defaultdict(int)
+        self.phase_seconds = defaultdict(float)
+        self.timers = defaultdict(Histogram)
+
+    def start_request(self):
+        _current.set(RequestTiming())
+
+    def finish_request(self, endpoint, method, status):
+        # Returns {phase: seconds} including 'total' and 'python'
+        timing = _current.get()
+        if timing is None:
+            return None
+        _current.set(None)
+
+        total = time.perf_counter() - timing.started
+        phases = dict(timing.phases)
+        phases['python'] = max(total - sum(phases.values()), 0.0)
+        with self._lock:
+            self.latency[(endpoint, method)].observe(total)
+            self.responses[(endpoint, method, status)] += 1
+            for name, seconds in phases.items():
+                self.phase_seconds[(endpoint, name)] += seconds
+        phases['total'] = total
+        phases['mongo_ops'] = timing.mongo_ops
+        return phases
+
+    def observe(self, name, seconds):
+        with self._lock:
+            self.timers[name].observe(seconds)
+
+    @contextmanager
+    def phase(self, name):
+        # Times a block into the named timer and the current request
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.observe(name, elapsed)
+            timing = _current.get()
+            if timing is not None:
+                timing.add(name, elapsed)
+
+    def render(self, collectors=()):
+        # Prometheus text exposition format
+        lines = []
+
+        def histogram(name, help_text, series):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            for labels, hist in series:
+                for bound, count in hist.cumulative():
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{name}_bucket{_labels(labels, le=le)} {count}')
+                lines.append(f'{name}_sum{_labels(labels)} {hist.sum:.6f}')
+                lines.append(f'{name}_count{_labels(labels)} {hist.count}')
+
+        with self._lock:
+            histogram(
+                'contacthub_request_duration_seconds', 'Request latency by endpoint.',
+                [({'endpoint': e, 'method': m}, h) for (e, m), h in sorted(self.latency.items())]
+            )
+            lines.append('# HELP contacthub_responses_total Responses by endpoint and status.')
+            lines.append('# TYPE contacthub_responses_total counter')
+            for (e, m, s), count in sorted(self.responses.items()):
+                lines.append(f'contacthub_responses_total{_labels({"endpoint": e, "method": m, "status": s})} {count}')
+            lines.append('# HELP contacthub_request_phase_seconds_total Request time spent per phase.')
+            lines.append('# TYPE contacthub_request_phase_seconds_total counter')
+            for (e, p), seconds in sorted(self.phase_seconds.items()):
+                lines.append(f'contacthub_request_phase_seconds_total{_labels({"endpoint": e, "phase": p})} {seconds:.6f}')
+            histogram(
+                'contacthub_timer_seconds', 'Timed operations such as hashing and mail delivery.',
+                [({'name': n}, h) for n, h in sorted(self.timers.items())]
+            )
+
+        for component, stats in collectors:
+            try:
+                values = stats()
+            except Exception as e:
+                request_log.warning(json.dumps({'event': 'metrics_collect_error', 'component': component, 'error': str(e)}))
+                continue
+            for key, value in _flatten(values):
+                name = f'contacthub_{component}_{key}'
+                lines.append(f'# TYPE {name} gauge')
+                lines.append(f'{name} {float(value)}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(labels, **extra):
+    labels = {**labels, **extra}
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"') for v in labels.values())
+    return '{' + ','.join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + '}'
+
+
+def _flatten(values, prefix=''):
+    # Numeric leaves of a stats() dict; text values are skipped
+    for key, value in values.items():
+        name = f'{prefix}{key}'
+        if isinstance(value, dict):
+            yield from _flatten(value, f'{name}_')
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield name, value
+
+
+def server_timing(phases):
+    # Server-Timing header value, durations in milliseconds
+    return ', '.join(
+        f'{name};dur={phases[name] * 1000:.1f}'
+        for name in ('mongo', 'hash', 'python', 'total') if name in phases
+    )
+
+
+def log_request(method, path, endpoint, status, phases):
+    level = logging.ERROR if status >= 500 else logging.INFO
+    if not request_log.isEnabledFor(level):
+        return
+    request_log.log(level, json.dumps({
+        'event': 'request',
+        'method': method,
+        'path': path,
+        'endpoint': endpoint,
+        'status': status,
+        'duration_ms': round(phases['total'] * 1000, 2),
+        'mongo_ms': round(phases.get('mongo', 0.0) * 1000, 2),
+        'mongo_ops': phases['mongo_ops'],
+        'hash_ms': round(phases.get('hash', 0.0) * 1000, 2),
+        'python_ms': round(phases['python'] * 1000, 2)
+    }))
+
+
+metrics = Metrics()
+
+
+def collectors():
+    from app.activity import activity_log
+    from app.cache import user_cache
+    from app.contact_cache import contact_cache
+    from app.events import broker
+    from app.hash_pool import hash_service
+    from app.mongo_pool import pool_metrics
+    from app.outbox import outbox
+    from app.search import typeahead_indexes
+    return [
+        ('user_cache', user_cache.stats),
+        ('typeahead_cache', typeahead_indexes.stats),
+        ('contact_cache', contact_cache.stats),
+        ('activity_log', activity_log.stats),
+        ('mail_outbox', outbox.stats),
+        ('stats_streams', broker.stats),
+        ('hash_pool', hash_service.stats),
+        ('mongo', lambda: _pool_summary(pool_metrics.stats())),
+    ]
+
+
+def _pool_summary(stats):
+    pools = stats['pools'].values()
+    checkout = stats['checkout']
+    return {
+        'connections_open': sum(p['open'] for p in pools),
+        'connections_in_use': sum(p['in_use'] for p in pools),
+        'checkouts_waiting': sum(p['waiting'] for p in pools),
+        'checkouts': checkout['count'],
+        'checkout_wait_avg_ms': checkout['avg_wait_ms'],
+        'checkout_wait_max_ms': checkout['max_wait_ms'],
+        'checkout_failures': sum(checkout['failures'].values())
+    }
+
+
+def init_app(app):
+    # Time every request, log it as one JSON line and report the phases in
+    # a Server-Timing header
+    from flask import request
+
+    if not request_log.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        request_log.addHandler(handler)
+        request_log.propagate = False
+    # REQUEST_LOG=false only silences the per-request INFO lines; 5xx
+    # requests and collector failures are still logged
+    request_log.setLevel(logging.INFO if app.config.get('REQUEST_LOG') else logging.WARNING)
+    send_timing = app.config.get('SERVER_TIMING')
+
+    @app.before_request
+    def start_timing():
+        metrics.start_request()
+
+    @app.after_request
+    def finish_timing(response):
+        endpoint = request.endpoint or 'unmatched'
+        phases = metrics.finish_request(endpoint, request.method, response.status_code)
+        if phases is not None:
+            if send_timing:
+                response.headers['Server-Timing'] = server_timing(phases)
+            log_request(request.method, request.path, endpoint, response.status_code, phases)
+        return response
@@ -0,0 +1,170 @@
+import threading
+from collections import defaultdict
+from pymongo import common, monitoring
+from app.metrics import command_timer
+
+# Upper bounds (ms) of the checkout wait histogram
+WAIT_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+
+def mongo_client_options(config):
+    # Keyword arguments for every MongoClient/AsyncMongoClient the app opens
+    options = {
+        'maxPoolSize': config['MONGO_MAX_POOL_SIZE'],
+        'minPoolSize': config['MONGO_MIN_POOL_SIZE'],
+        'serverSelectionTimeoutMS': config['MONGO_SERVER_SELECTION_TIMEOUT_MS'],
+        'readPreference': config['MONGO_READ_PREFERENCE'],
+        'event_listeners': [pool_metrics, command_timer],
+    }
+    if config['MONGO_WAIT_QUEUE_TIMEOUT_MS']:
+        options['waitQueueTimeoutMS'] = config['MONGO_WAIT_QUEUE_TIMEOUT_MS']
+    if config['MONGO_COMPRESSORS']:
+        options['compressors'] = config['MONGO_COMPRESSORS']
+    return options
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener, monitoring.CommandListener):
+    # Connection pool and command telemetry from the driver's event API.
+    # Callbacks run on request threads and must stay cheap: counters only.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.pools = {}
+        self.reset()
+
+    def reset(self):
+        # Counters only; the pool gauges describe the current state
+        with self._lock:
+            for pool in self.pools.values():
+                pool['peak_in_use'] = pool['in_use']
+            self.waits = 0
+            self.wait_total = 0.0
+            self.wait_max = 0.0
+            self.wait_buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)
+            self.checkout_failures = defaultdict(int)
+            self.commands = defaultdict(lambda: {'count': 0, 'failed': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+
+    def _pool(self, address):
+        key = '%s:%s' % address
+        pool = self.pools.get(key)
+        if pool is None:
+            pool = self.pools[key] = {
+                'max_size': None, 'open': 0, 'in_use': 0, 'waiting': 0, 'peak_in_use': 0
+            }
+        return pool
+
+    # Connection pool events
+
+    def pool_created(self, event):
+        with self._lock:
+            # Only non-default options are reported
+            self._pool(event.address)['max_size'] = event.options.get('maxPoolSize', common.MAX_POOL_SIZE)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        with self._lock:
+            self.pools.pop('%s:%s' % event.address, None)
+
+    def connection_created(self, event):
+        with self._lock:
+            self._pool(event.address)['open'] += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool['open'] = max(pool['open'] - 1, 0)
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            self._pool(event.address)['waiting'] += 1
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool['waiting'] = max(pool['waiting'] - 1, 0)
+            self.checkout_failures[str(event.reason)] += 1
+            self._record_wait(event.duration)
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool['waiting'] = max(pool['waiting'] - 1, 0)
+            pool['in_use'] += 1
+            pool['peak_in_use'] = max(pool['peak_in_use'], pool['in_use'])
+            self._record_wait(event.duration)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool['in_use'] = max(pool['in_use'] - 1, 0)
+
+    def _record_wait(self, seconds):
+        ms = (seconds or 0.0) * 1000
+        self.waits += 1
+        self.wait_total += ms
+        self.wait_max = max(self.wait_max, ms)
+        for i, bound in enumerate(WAIT_BUCKETS_MS):
+            if ms <= bound:
+                self.wait_buckets[i] += 1
+                break
+        else:
+            self.wait_buckets[-1] += 1
+
+    # Command events
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record_command(event.command_name, event.duration_micros, failed=False)
+
+    def failed(self, event):
+        self._record_command(event.command_name, event.duration_micros, failed=True)
+
+    def _record_command(self, name, micros, failed):
+        ms = micros / 1000
+        with self._lock:
+            command = self.commands[name]
+            command['count'] += 1
+            command['total_ms'] += ms
+            command['max_ms'] = max(command['max_ms'], ms)
+            if failed:
+                command['failed'] += 1
+
+    def stats(self):
+        with self._lock:
+            pools = {}
+            for address, pool in self.pools.items():
+                saturation = pool['in_use'] / pool['max_size'] if pool['max_size'] else None
+                pools[address] = {**pool, 'saturation': saturation}
+
+            cumulative, histogram = 0, {}
+            for bound, count in zip(WAIT_BUCKETS_MS + ('+Inf',), self.wait_buckets):
+                cumulative += count
+                histogram[str(bound)] = cumulative
+
+            return {
+                'pools': pools,
+                'checkout': {
+                    'count': self.waits,
+                    'avg_wait_ms': self.wait_total / self.waits if self.waits else 0.0,
+                    'max_wait_ms': self.wait_max,
+                    'wait_ms_le': histogram,
+                    'failures': dict(self.checkout_failures)
+                },
+                'commands': {
+                    name: {**command, 'avg_ms': command['total_ms'] / command['count']}
+                    for name, command in self.commands.items()
+                }
+            }
+
+
+pool_metrics = PoolMetrics()
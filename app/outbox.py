@@ -0,0 +1,241 @@
+import atexit
+import os
+import smtplib
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from flask_mail import Message
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+from app import mongo, mail
+from app.metrics import metrics
+
+PENDING = 'pending'
+SENDING = 'sending'
+SENT = 'sent'
+FAILED = 'failed'
+
+
+class MailOutbox:
+    # Mongo-backed outgoing mail queue.
+    #
+    # Routes call enqueue() and return immediately. A small pool of worker
+    # threads, started when a process begins serving, claims due messages
+    # from `mail_outbox` (including ones queued before a restart), sends
+    # them over an SMTP
+    # connection each worker keeps open between messages, and reschedules
+    # failures with exponential backoff until max_attempts is reached.
+    # Messages left in 'sending' by a dead worker are reclaimed once their
+    # lease expires.
+
+    def __init__(self):
+        self.app = None
+        self.workers = 2
+        self.poll_interval = 5.0
+        self.max_attempts = 5
+        self.backoff_base = 10.0
+        self.backoff_max = 900.0
+        self.lease_seconds = 120
+        self.idle_timeout = 60.0
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._pid = None
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.connections_opened = 0
+
+    def init_app(self, app):
+        self.app = app
+        self.workers = app.config.get('MAIL_OUTBOX_WORKERS', self.workers)
+        self.poll_interval = app.config.get('MAIL_OUTBOX_POLL_INTERVAL', self.poll_interval)
+        self.max_attempts = app.config.get('MAIL_OUTBOX_MAX_ATTEMPTS', self.max_attempts)
+        self.backoff_base = app.config.get('MAIL_OUTBOX_BACKOFF_BASE', self.backoff_base)
+        self.backoff_max = app.config.get('MAIL_OUTBOX_BACKOFF_MAX', self.backoff_max)
+        self.lease_seconds = app.config.get('MAIL_OUTBOX_LEASE_SECONDS', self.lease_seconds)
+        self.idle_timeout = app.config.get('MAIL_CONNECTION_IDLE_TIMEOUT', self.idle_timeout)
+
+        # serve.py starts the workers as each server process boots; this
+        # covers other servers, and CLI commands never get here
+        app.before_request(self.ensure_started)
+
+    def enqueue(self, subject, recipients, html=None, body=None, sender=None):
+        now = datetime.now(timezone.utc)
+        result = mongo.db.mail_outbox.insert_one({
+            'subject': subject,
+            'sender': sender,
+            'recipients': list(recipients),
+            'html': html,
+            'body': body,
+            'status': PENDING,
+            'attempts': 0,
+            'next_attempt_at': now,
+            'created_at': now
+        })
+        if self.workers > 0:
+            self.ensure_started()
+            self._wakeup.set()
+        return result.inserted_id
+
+    def ensure_started(self):
+        # Cheap enough to call on every request: starts the workers once per
+        # process, so pending, backed-off and abandoned messages are picked
+        # up without waiting for the next enqueue
+        if self.workers > 0 and (not self._threads or self._pid != os.getpid()):
+            self.start()
+
+    def start(self, workers=None):
+        with self._lock:
+            # Threads do not survive a fork, start a fresh pool in the child
+            if self._threads and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stopping.clear()
+            self._threads = [
+                threading.Thread(target=self._run, name=f'mail-outbox-{i}', daemon=True)
+                for i in range(workers or self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def stop(self, timeout=10.0):
+        with self._lock:
+            threads, self._threads = self._threads, []
+        if self._pid != os.getpid():
+            return
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in threads:
+            thread.join(timeout)
+
+    def join(self):
+        for thread in list(self._threads):
+            thread.join()
+
+    def stats(self):
+        counts = {PENDING: 0, SENDING: 0, FAILED: 0}
+        try:
+            for row in mongo.db.mail_outbox.aggregate([
+                {'$match': {'status': {'$in': list(counts)}}},
+                {'$group': {'_id': '$status', 'count': {'$sum': 1}}}
+            ]):
+                counts[row['_id']] = row['count']
+        except PyMongoError as e:
+            print(f"Mail outbox stats error: {str(e)}")
+        return {
+            'queue_depth': counts[PENDING],
+            'in_flight': counts[SENDING],
+            'dead_letters': counts[FAILED],
+            'workers': len(self._threads),
+            'sent': self.sent,
+            'retried': self.retried,
+            'failed': self.failed,
+            'connections_opened': self.connections_opened
+        }
+
+    def _claim(self):
+        now = datetime.now(timezone.utc)
+        return mongo.db.mail_outbox.find_one_and_update(
+            {'$or': [
+                {'status': PENDING, 'next_attempt_at': {'$lte': now}},
+                {'status': SENDING, 'locked_until': {'$lte': now}}
+            ]},
+            {
+                '$set': {'status': SENDING, 'locked_until': now + timedelta(seconds=self.lease_seconds)},
+                '$inc': {'attempts': 1}
+            },
+            sort=[('next_attempt_at', 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    def _run(self):
+        with self.app.app_context():
+            connection = None
+            last_used = 0.0
+            while not self._stopping.is_set():
+                try:
+                    doc = self._claim()
+                except PyMongoError as e:
+                    print(f"Mail outbox claim error: {str(e)}")
+                    doc = None
+
+                if doc is None:
+                    # Close the SMTP session if it has been idle for too long
+                    if connection is not None and time.monotonic() - last_used > self.idle_timeout:
+                        connection = self._close(connection)
+                    self._wakeup.wait(self.poll_interval)
+                    self._wakeup.clear()
+                    continue
+
+                try:
+                    if connection is None:
+                        connection = self._open()
+                    self._send(connection, doc)
+                    last_used = time.monotonic()
+                except (smtplib.SMTPException, OSError) as e:
+                    # The session is likely unusable, reconnect for the next message
+                    connection = self._close(connection)
+                    self._failed(doc, e)
+                except Exception as e:
+                    self._failed(doc, e)
+
+            self._close(connection)
+
+    def _open(self):
+        connection = mail.connect()
+        with metrics.phase('mail_connect'):
+            connection.__enter__()
+        self.connections_opened += 1
+        return connection
+
+    def _close(self, connection):
+        if connection is not None:
+            try:
+                connection.__exit__(None, None, None)
+            except (smtplib.SMTPException, OSError):
+                pass
+        return None
+
+    def _send(self, connection, doc):
+        msg = Message(
+            doc['subject'],
+            sender=doc.get('sender'),
+            recipients=doc['recipients'],
+            body=doc.get('body'),
+            html=doc.get('html')
+        )
+        with metrics.phase('mail_send'):
+            connection.send(msg)
+        mongo.db.mail_outbox.update_one(
+            {'_id': doc['_id']},
+            {
+                '$set': {'status': SENT, 'sent_at': datetime.now(timezone.utc)},
+                '$unset': {'locked_until': '', 'html': '', 'body': ''}
+            }
+        )
+        self.sent += 1
+
+    def _failed(self, doc, error):
+        print(f"Mail delivery error for {doc['_id']}: {str(error)}")
+        update = {'last_error': str(error)}
+        if doc['attempts'] >= self.max_attempts:
+            update['status'] = FAILED
+            self.failed += 1
+        else:
+            delay = min(self.backoff_base * 2 ** (doc['attempts'] - 1), self.backoff_max)
+            update['status'] = PENDING
+            update['next_attempt_at'] = datetime.now(timezone.utc) + timedelta(seconds=delay)
+            self.retried += 1
+        try:
+            mongo.db.mail_outbox.update_one(
+                {'_id': doc['_id']},
+                {'$set': update, '$unset': {'locked_until': ''}}
+            )
+        except PyMongoError as e:
+            print(f"Mail outbox update error: {str(e)}")
+
+
+outbox = MailOutbox()
+atexit.register(outbox.stop)
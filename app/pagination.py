@@ -0,0 +1,46 @@
+import base64
+import json
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
+from bson.errors import InvalidId
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _millis(moment):
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return (moment - EPOCH) // timedelta(milliseconds=1)
+
+
+def encode_cursor(document, field='created_at'):
+    # Opaque continuation token for the last document of a page
+    payload = json.dumps({'t': _millis(document[field]), 'i': str(document['_id'])}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return EPOCH + timedelta(milliseconds=int(payload['t'])), ObjectId(payload['i'])
+    except (ValueError, KeyError, TypeError, InvalidId) as e:
+        raise InvalidCursor('Invalid cursor') from e
+
+
+def keyset_filter(base, token, field='created_at'):
+    # Documents strictly after the cursor in (field desc, _id desc) order
+    if not token:
+        return base
+    moment, last_id = decode_cursor(token)
+    return {
+        **base,
+        '$or': [
+            {field: {'$lt': moment}},
+            {field: moment, '_id': {'$lt': last_id}}
+        ]
+    }
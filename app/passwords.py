@@ -0,0 +1,103 @@
+import bcrypt
+from werkzeug.security import check_password_hash, generate_password_hash
+from app import mongo
+from app.cache import user_cache
+from app.hash_pool import HashPoolSaturated, hash_service
+
+SCRYPT = 'scrypt'
+PBKDF2 = 'pbkdf2'
+BCRYPT = 'bcrypt'
+
+# bcrypt only looks at the first 72 bytes of a password
+BCRYPT_MAX_BYTES = 72
+
+
+class PasswordHasher:
+    # Hashes new passwords with the configured algorithm and cost, and
+    # verifies any hash this app has ever written: werkzeug's scrypt/pbkdf2
+    # strings ("scrypt:32768:8:1$salt$hash") and bcrypt ("$2b$12$...").
+
+    def __init__(self, algorithm=SCRYPT, scrypt_n=2 ** 15, pbkdf2_iterations=600000, bcrypt_rounds=12):
+        self.algorithm = algorithm
+        self.scrypt_n = scrypt_n
+        self.pbkdf2_iterations = pbkdf2_iterations
+        self.bcrypt_rounds = bcrypt_rounds
+
+    def configure(self, config):
+        self.algorithm = config.get('PASSWORD_HASH_ALGORITHM', self.algorithm)
+        self.scrypt_n = config.get('PASSWORD_SCRYPT_N', self.scrypt_n)
+        self.pbkdf2_iterations = config.get('PASSWORD_PBKDF2_ITERATIONS', self.pbkdf2_iterations)
+        self.bcrypt_rounds = config.get('PASSWORD_BCRYPT_ROUNDS', self.bcrypt_rounds)
+        if self.algorithm not in (SCRYPT, PBKDF2, BCRYPT):
+            raise ValueError(f'Unknown PASSWORD_HASH_ALGORITHM: {self.algorithm}')
+
+    @property
+    def method(self):
+        # Parameter string of newly written hashes, compared by needs_rehash
+        if self.algorithm == BCRYPT:
+            return f'$2b${self.bcrypt_rounds:02d}'
+        if self.algorithm == PBKDF2:
+            return f'pbkdf2:sha256:{self.pbkdf2_iterations}'
+        return f'scrypt:{self.scrypt_n}:8:1'
+
+    def hash(self, password):
+        if self.algorithm == BCRYPT:
+            salt = bcrypt.gensalt(rounds=self.bcrypt_rounds)
+            return bcrypt.hashpw(password.encode('utf-8')[:BCRYPT_MAX_BYTES], salt).decode('ascii')
+        return generate_password_hash(password, method=self.method)
+
+    def verify(self, stored, password):
+        if not stored:
+            return False
+        if stored.startswith('$2'):
+            try:
+                return bcrypt.checkpw(password.encode('utf-8')[:BCRYPT_MAX_BYTES], stored.encode('ascii'))
+            except ValueError:
+                return False
+        return check_password_hash(stored, password)
+
+    def needs_rehash(self, stored):
+        if stored.startswith('$2'):
+            return not stored.startswith(self.method + '$')
+        return stored.split('$', 1)[0] != self.method
+
+
+hasher = PasswordHasher()
+
+
+# Top-level so they can be pickled into the hashing pool; the hasher travels
+# with each call so pool processes need no configuration of their own
+def _hash(configured, password):
+    return configured.hash(password)
+
+
+def _verify(configured, stored, password):
+    return configured.verify(stored, password)
+
+
+def hash_password(password):
+    return hash_service.run(_hash, hasher, password)
+
+
+def verify_password(stored, password):
+    return hash_service.run(_verify, hasher, stored, password)
+
+
+def verify_and_upgrade(user, password):
+    # Check a login password and, when the stored hash was made with other
+    # parameters than the current configuration, replace it. The upgrade is
+    # best effort: a busy pool skips it rather than failing a correct login,
+    # and a later login retries it.
+    if not verify_password(user.get('password'), password):
+        return False
+    if hasher.needs_rehash(user['password']):
+        try:
+            upgraded = hash_password(password)
+        except HashPoolSaturated:
+            return True
+        mongo.db.users.update_one(
+            {'_id': user['_id'], 'password': user['password']},
+            {'$set': {'password': upgraded}}
+        )
+        user_cache.invalidate(str(user['_id']))
+    return True
@@ -0,0 +1,223 @@
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from functools import wraps
+
+
+class ProfileSession:
+    # Samples the Python stacks of running threads from a background thread
+    # and counts them in collapsed-stack form ("root;caller;callee count"),
+    # the input of flamegraph.pl and speedscope. Only exists while a profile
+    # is being taken.
+
+    def __init__(self, name, interval, duration, threads=None, on_done=None):
+        self.name = name
+        self.interval = interval
+        self.duration = duration
+        self.threads = threads
+        self.on_done = on_done
+        self.counts = Counter()
+        self.samples = 0
+        self.started_at = None
+        self.path = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    @property
+    def running(self):
+        return self._thread is not None and not self._stop.is_set()
+
+    def _run(self):
+        own = threading.get_ident()
+        deadline = time.monotonic() + self.duration
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            threads = self.threads
+            for ident, frame in sys._current_frames().items():
+                if ident == own or (threads is not None and ident not in threads):
+                    continue
+                self.counts[_collapse(names.get(ident, str(ident)), frame)] += 1
+            self.samples += 1
+        self._stop.set()
+        if self.on_done is not None:
+            self.on_done(self)
+
+    def write(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')
+        safe_name = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in self.name)
+        path = os.path.join(directory, f'{safe_name}-{os.getpid()}-{stamp}.collapsed')
+        with open(path + '.tmp', 'w') as f:
+            for stack, count in self.counts.most_common():
+                f.write(f'{stack} {count}\n')
+        os.replace(path + '.tmp', path)
+        self.path = path
+        return path
+
+    def summary(self):
+        return {
+            'name': self.name,
+            'running': self.running,
+            'started_at': self.started_at,
+            'interval_ms': self.interval * 1000,
+            'samples': self.samples,
+            'stacks': len(self.counts),
+            'path': self.path
+        }
+
+
+def _collapse(thread_name, frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f'{code.co_name} ({code.co_filename}:{code.co_firstlineno})')
+        frame = frame.f_back
+    stack.append(thread_name)
+    return ';'.join(part.replace(';', ':') for part in reversed(stack))
+
+
+class Profiler:
+    # On-demand profiling of this worker process. Nothing is sampled or
+    # wrapped until a profile is requested: a whole-process profile runs a
+    # sampler thread for a bounded time, a route capture swaps the view
+    # function for a wrapper that registers its thread with the sampler and
+    # restores the original after the requested number of requests.
+
+    def __init__(self):
+        self.directory = 'profiles'
+        self.interval = 0.005
+        self.max_seconds = 120
+        self._lock = threading.Lock()
+        self._session = None
+        self._captures = {}
+        self.recent = []
+
+    def configure(self, config):
+        self.directory = config.get('PROFILE_DIR', self.directory)
+        self.interval = config.get('PROFILE_INTERVAL_MS', self.interval * 1000) / 1000
+        self.max_seconds = config.get('PROFILE_MAX_SECONDS', self.max_seconds)
+
+    def _interval(self, interval_ms):
+        return max(interval_ms / 1000, 0.001) if interval_ms else self.interval
+
+    def start(self, seconds, interval_ms=None):
+        # Profile every thread for `seconds`; returns None if a whole-process
+        # profile is already running
+        seconds = max(0.1, min(seconds, self.max_seconds))
+        with self._lock:
+            if self._session is not None and self._session.running:
+                return None
+            session = ProfileSession('process', self._interval(interval_ms), seconds, on_done=self._save)
+            self._session = session
+            session.start()
+        return session
+
+    def capture(self, app, endpoint, requests, interval_ms=None):
+        # Profile the next `requests` calls of a view; returns None if that
+        # view is already being captured
+        with self._lock:
+            if endpoint in self._captures:
+                return None
+            view = app.view_functions[endpoint]
+            session = ProfileSession(endpoint, self._interval(interval_ms), self.max_seconds, threads=set())
+            state = {'remaining': requests, 'active': 0, 'done': False}
+
+            def release():
+                # Put the original view back; called with the lock held
+                if app.view_functions.get(endpoint) is profiled:
+                    app.view_functions[endpoint] = view
+                self._captures.pop(endpoint, None)
+
+            def finish():
+                session.stop()
+                self._save(session)
+
+            @wraps(view)
+            def profiled(*args, **kwargs):
+                with self._lock:
+                    if state['remaining'] <= 0 or state['done']:
+                        traced = False
+                    else:
+                        traced = True
+                        state['remaining'] -= 1
+                        state['active'] += 1
+                        if state['remaining'] == 0:
+                            release()
+                if not traced:
+                    return view(*args, **kwargs)
+
+                ident = threading.get_ident()
+                session.threads.add(ident)
+                try:
+                    return view(*args, **kwargs)
+                finally:
+                    session.threads.discard(ident)
+                    with self._lock:
+                        state['active'] -= 1
+                        last = state['remaining'] == 0 and state['active'] == 0 and not state['done']
+                        if last:
+                            state['done'] = True
+                    if last:
+                        finish()
+
+            def expire():
+                # Stop waiting for requests once the time limit is reached
+                with self._lock:
+                    if state['done']:
+                        return
+                    state['remaining'] = 0
+                    release()
+                    last = state['active'] == 0
+                    if last:
+                        state['done'] = True
+                if last:
+                    finish()
+
+            app.view_functions[endpoint] = profiled
+            self._captures[endpoint] = session
+            session.start()
+            timer = threading.Timer(self.max_seconds, expire)
+            timer.daemon = True
+            timer.start()
+        return session
+
+    def _save(self, session):
+        try:
+            session.write(self.directory)
+        except OSError as e:
+            print(f"Profile write error: {str(e)}")
+        with self._lock:
+            self.recent = (self.recent + [session.summary()])[-10:]
+
+    def status(self):
+        with self._lock:
+            session = self._session
+            return {
+                'process': session.summary() if session is not None and session.running else None,
+                'captures': {endpoint: s.summary() for endpoint, s in self._captures.items()},
+                'recent': list(self.recent)
+            }
+
+    def install_signal_handler(self, signum, seconds=30):
+        # kill -<signal> <worker pid> starts a whole-process profile
+        def handler(signo, frame):
+            # Leave the interrupted code alone, it may hold our lock
+            threading.Thread(target=self.start, args=(seconds,), daemon=True).start()
+        signal.signal(signum, handler)
+
+
+profiler = Profiler()
@@ -0,0 +1,239 @@
+import gzip
+import json
+import os
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from pymongo import ASCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+from app import mongo
+from app.serialization import bson_default
+
+# Raw activity rows are only needed for the short recent-activity list, so
+# they are kept for ACTIVITY_RETENTION_DAYS. Long-term history lives in one
+# `activity_rollups` document per user per UTC day:
+#
+#   {'user_id': ObjectId, 'day': datetime, 'counts': {'added': int, 'searched': int},
+#    'batches': [ObjectId, ...]}
+#
+# Rollups are incremented when activities are written; `batches` remembers
+# the last batches counted so a retried write is not counted twice. Rows
+# logged before that are counted once by backfill_rollups, which has to
+# finish before any raw row expires: compact_activities runs it first, and
+# in TTL mode the TTL index is only created once it is done. Progress lives in
+#
+#   retention_state {'_id': 'activity_rollups', 'counted_from': datetime,
+#                    'backfill_last_id': ObjectId, 'backfilled': bool}
+#
+# where counted_from is the earliest activity counted as it was written.
+
+ROLLUP_STATE = 'activity_rollups'
+
+# Batch ids kept per rollup document; a retry follows its failed attempt
+# within seconds, so only the last few can come back
+ROLLUP_BATCHES_KEPT = 16
+
+# Whether this process has recorded counted_from yet
+_counting = False
+
+
+def _day(moment):
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return datetime(moment.year, moment.month, moment.day, tzinfo=timezone.utc)
+
+
+def record_rollups(activities):
+    global _counting
+    if not _counting:
+        # Everything from this batch on is counted here, older rows are
+        # left to the backfill
+        timestamps = [a['timestamp'] for a in activities if isinstance(a.get('timestamp'), datetime)]
+        if timestamps:
+            mongo.db.retention_state.update_one(
+                {'_id': ROLLUP_STATE},
+                {'$min': {'counted_from': min(timestamps)}},
+                upsert=True
+            )
+            _counting = True
+    _increment_rollups(activities)
+
+
+def _increment_rollups(activities):
+    counts = defaultdict(Counter)
+    for activity in activities:
+        if 'user_id' not in activity or not isinstance(activity.get('timestamp'), datetime):
+            continue
+        kind = activity.get('type', 'unknown').replace('contact_', '')
+        counts[(activity['user_id'], _day(activity['timestamp']))][kind] += 1
+    if not counts:
+        return
+
+    # The smallest activity _id names the batch. A document that already
+    # counted it does not match, and its upsert fails on the unique user_day
+    # index instead of adding the counts again.
+    ids = [activity['_id'] for activity in activities if '_id' in activity]
+    batch = min(ids) if ids else None
+    updates = []
+    for (user_id, day), kinds in counts.items():
+        query = {'user_id': user_id, 'day': day}
+        update = {'$inc': {f'counts.{kind}': count for kind, count in kinds.items()}}
+        if batch is not None:
+            query['batches'] = {'$ne': batch}
+            update['$push'] = {'batches': {'$each': [batch], '$slice': -ROLLUP_BATCHES_KEPT}}
+        updates.append(UpdateOne(query, update, upsert=True))
+    try:
+        mongo.db.activity_rollups.bulk_write(updates, ordered=False)
+    except BulkWriteError as e:
+        details = e.details or {}
+        if details.get('writeConcernErrors') or any(
+            error.get('code') != 11000 for error in details.get('writeErrors', ())
+        ):
+            raise
+
+
+def backfill_rollups(batch_size=1000):
+    # Count activities written before rollups existed. Walks them in _id
+    # order and saves its position after every batch, so an interrupted run
+    # resumes where it stopped. Returns the number of activities counted.
+    state = mongo.db.retention_state.find_one_and_update(
+        {'_id': ROLLUP_STATE},
+        {'$min': {'counted_from': datetime.now(timezone.utc)}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    if state.get('backfilled'):
+        return 0
+
+    query = {'timestamp': {'$lt': state['counted_from']}}
+    last_id = state.get('backfill_last_id')
+    counted = 0
+    while True:
+        batch_query = dict(query)
+        if last_id is not None:
+            batch_query['_id'] = {'$gt': last_id}
+        batch = list(mongo.db.activities.find(
+            batch_query, {'user_id': 1, 'type': 1, 'timestamp': 1}
+        ).sort('_id', ASCENDING).limit(batch_size))
+        if not batch:
+            break
+        _increment_rollups(batch)
+        last_id = batch[-1]['_id']
+        mongo.db.retention_state.update_one({'_id': ROLLUP_STATE}, {'$set': {'backfill_last_id': last_id}})
+        counted += len(batch)
+
+    mongo.db.retention_state.update_one(
+        {'_id': ROLLUP_STATE},
+        {'$set': {'backfilled': True}, '$unset': {'backfill_last_id': ''}}
+    )
+    return counted
+
+
+def rollups_backfilled():
+    # True when no activity is waiting to be counted by backfill_rollups
+    try:
+        state = mongo.db.retention_state.find_one({'_id': ROLLUP_STATE}) or {}
+        if state.get('backfilled'):
+            return True
+        uncounted = {'timestamp': {'$lt': state['counted_from']}} if 'counted_from' in state else {}
+        if mongo.db.activities.find_one(uncounted, {'_id': 1}) is not None:
+            return False
+        mongo.db.retention_state.update_one({'_id': ROLLUP_STATE}, {'$set': {'backfilled': True}}, upsert=True)
+        return True
+    except PyMongoError as e:
+        print(f"Rollup backfill check failed: {str(e)}")
+        return False
+
+
+def delete_user_rollups(user_id):
+    mongo.db.activity_rollups.delete_many({'user_id': user_id})
+
+
+def retention_indexes(config):
+    # Extra index specs for ensure_indexes, depending on the retention mode
+    indexes = [
+        ('activity_rollups', [('user_id', ASCENDING), ('day', ASCENDING)],
+         {'name': 'user_day', 'unique': True}),
+    ]
+    mode = config.get('ACTIVITY_RETENTION_MODE')
+    if mode == 'ttl':
+        # The TTL index would expire rows the rollups have not counted yet
+        if not rollups_backfilled():
+            print("Activity TTL index not created: run `flask backfill-rollups` first")
+            return indexes
+        indexes.append((
+            'activities', [('timestamp', ASCENDING)],
+            {'name': 'timestamp_ttl',
+             'expireAfterSeconds': int(config['ACTIVITY_RETENTION_DAYS']) * 86400}
+        ))
+    elif mode == 'compact':
+        indexes.append((
+            'activities', [('timestamp', ASCENDING)], {'name': 'timestamp'}
+        ))
+    return indexes
+
+
+class ActivityArchive:
+    # Appends expired activities to a gzip-compressed NDJSON file, one file
+    # per compaction run. The file is only created once there is something
+    # to write.
+
+    def __init__(self, directory, now):
+        self.path = os.path.join(directory, f"activities-{now:%Y%m%dT%H%M%SZ}.ndjson.gz")
+        self._raw = None
+        self._gzip = None
+        self.rows = 0
+
+    def write(self, activities):
+        if self._gzip is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._raw = open(self.path, 'ab')
+            self._gzip = gzip.GzipFile(fileobj=self._raw, mode='ab')
+        for activity in activities:
+            line = json.dumps(activity, default=bson_default, separators=(',', ':')) + '\n'
+            self._gzip.write(line.encode('utf-8'))
+        # Rows must be on disk before the batch is deleted
+        self._gzip.flush()
+        self._raw.flush()
+        os.fsync(self._raw.fileno())
+        self.rows += len(activities)
+
+    def close(self):
+        if self._gzip is not None:
+            self._gzip.close()
+            self._raw.close()
+
+
+def compact_activities(retention_days, archive_dir=None, batch_size=1000, dry_run=False):
+    # Delete raw activities older than the retention window, oldest first and
+    # in batches, archiving each batch before it is deleted when archive_dir
+    # is set. Rows that predate the rollups are counted first.
+    now = datetime.now(timezone.utc)
+    cutoff = now - timedelta(days=retention_days)
+    query = {'timestamp': {'$lt': cutoff}}
+    if dry_run:
+        return {'cutoff': cutoff.isoformat(), 'expired': mongo.db.activities.count_documents(query),
+                'deleted': 0, 'archive': None, 'backfilled': 0}
+
+    backfilled = backfill_rollups(batch_size=batch_size)
+    archive = ActivityArchive(archive_dir, now) if archive_dir else None
+    deleted = 0
+    try:
+        while True:
+            batch = list(mongo.db.activities.find(query).sort('timestamp', ASCENDING).limit(batch_size))
+            if not batch:
+                break
+            if archive is not None:
+                archive.write(batch)
+            result = mongo.db.activities.delete_many({'_id': {'$in': [a['_id'] for a in batch]}})
+            deleted += result.deleted_count
+    finally:
+        if archive is not None:
+            archive.close()
+
+    return {
+        'cutoff': cutoff.isoformat(),
+        'expired': deleted,
+        'deleted': deleted,
+        'archive': archive.path if archive is not None and archive.rows else None,
+        'backfilled': backfilled
+    }
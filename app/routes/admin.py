@@ -0,0 +1,86 @@
+from flask import Blueprint, request, jsonify, Response, current_app
+import hmac
+from functools import wraps
+from config import Config
+from app.mongo_pool import pool_metrics
+from app.metrics import collectors, metrics
+from app.profiler import profiler
+
+admin_bp = Blueprint('admin', __name__)
+
+def admin_required(f):
+    # These endpoints expose internals, reset counters and cost CPU, and
+    # serve.py binds every interface: without ADMIN_TOKEN they stay closed
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if not Config.ADMIN_TOKEN:
+            return jsonify({'error': 'Admin endpoints require ADMIN_TOKEN to be configured'}), 403
+        token = request.headers.get('Authorization', '')
+        supplied = token.split()[1] if len(token.split()) == 2 else ''
+        if not hmac.compare_digest(supplied, Config.ADMIN_TOKEN):
+            return jsonify({'error': 'Invalid admin token'}), 401
+        return f(*args, **kwargs)
+    return decorated
+
+def scrape_allowed(f):
+    # /metrics takes the admin token too, unless METRICS_PUBLIC opens it for
+    # a scraper that cannot send one
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if Config.METRICS_PUBLIC:
+            return f(*args, **kwargs)
+        return admin_required(f)(*args, **kwargs)
+    return decorated
+
+@admin_bp.route('/api/admin/mongo-pool', methods=['GET'])
+@admin_required
+def mongo_pool_stats():
+    # Checkout waits, pool saturation and per-command latency of this process
+    return jsonify(pool_metrics.stats()), 200
+
+@admin_bp.route('/api/admin/mongo-pool', methods=['POST'])
+@admin_required
+def reset_mongo_pool_stats():
+    # Ends the measuring window: returns its stats and starts a new one
+    stats = pool_metrics.stats()
+    pool_metrics.reset()
+    return jsonify(stats), 200
+
+@admin_bp.route('/metrics', methods=['GET'])
+@scrape_allowed
+def prometheus_metrics():
+    # Counters are per worker process; scrape each worker or run one
+    return Response(metrics.render(collectors()), mimetype='text/plain; version=0.0.4')
+
+@admin_bp.route('/api/admin/profile', methods=['GET'])
+@admin_required
+def profile_status():
+    return jsonify(profiler.status()), 200
+
+@admin_bp.route('/api/admin/profile', methods=['POST'])
+@admin_required
+def start_profile():
+    # Sample every thread of this worker for `seconds`, or with `endpoint`
+    # only the threads serving the next `requests` calls of that route
+    try:
+        data = request.get_json(silent=True) or {}
+        interval_ms = float(data['interval_ms']) if data.get('interval_ms') else None
+        
+        endpoint = data.get('endpoint')
+        if endpoint:
+            if endpoint not in current_app.view_functions:
+                return jsonify({'error': f'Unknown endpoint: {endpoint}'}), 404
+            requests = int(data.get('requests', 10))
+            if requests < 1:
+                return jsonify({'error': 'requests must be at least 1'}), 400
+            session = profiler.capture(current_app._get_current_object(), endpoint, requests, interval_ms)
+            if session is None:
+                return jsonify({'error': f'{endpoint} is already being profiled'}), 409
+            return jsonify({'message': f'Profiling the next {requests} requests of {endpoint}', **session.summary()}), 202
+        
+        session = profiler.start(float(data.get('seconds', 30)), interval_ms)
+        if session is None:
+            return jsonify({'error': 'A profile is already running'}), 409
+        return jsonify({'message': f'Profiling for {session.duration:g} seconds', **session.summary()}), 202
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': 'Invalid profile request', 'details': str(e)}), 400
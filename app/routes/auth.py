@@ -1,235 +1,27 @@
-from flask import Blueprint, request, jsonify, url_for, render_template_string
-from werkzeug.security import generate_password_hash, check_password_hash
-from app import mongo, mail
-from flask_mail import Message
+from flask import Blueprint, request, jsonify, url_for
+from app import mongo
 import jwt
 from datetime import datetime, timedelta
 from bson import ObjectId
 import secrets
 from config import Config
+from app.cache import user_cache
+from app.contact_cache import contact_cache
+from app.stats import delete_user_stats
+from app.search import invalidate_typeahead
+from app.retention import delete_user_rollups
+from app.passwords import hash_password, verify_and_upgrade, verify_password
+from app.hash_pool import HashPoolSaturated
+from app.activity import activity_log
+from app.outbox import outbox
+from app.emails import render_reset_email
 
 auth_bp = Blueprint('auth', __name__)
 
-# HTML email template
-EMAIL_TEMPLATE = """
-<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <style>
-        @import url('https://fonts.googleapis.com/css2?family=Orbitron:wght@400;500;600&display=swap');
-        
-        * {
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }
-        
-        body {
-            font-family: 'Orbitron', sans-serif;
-            background: #1e1e1e;
-            margin: 0;
-            padding: 16px;
-            color: white;
-            -webkit-font-smoothing: antialiased;
-            -moz-osx-font-smoothing: grayscale;
-        }
-        
-        .container {
-            max-width: 600px;
-            margin: 0 auto;
-            background: #222222;
-            border-radius: 12px;
-            overflow: hidden;
-            box-shadow: 0 4px 24px rgba(0, 0, 0, 0.2);
-        }
-        
-        .header {
-            background: #1a1a1a;
-            padding: 24px;
-            border-bottom: 1px solid #333;
-        }
-        
-        .logo-container {
-            display: flex;
-            align-items: center;
-            gap: 12px;
-        }
-        
-        .logo-circle {
-            width: 32px;
-            height: 32px;
-            background: #f97316;
-            border-radius: 50%;
-            flex-shrink: 0;
-        }
-        
-        .logo-text {
-            font-size: 24px;
-            font-weight: 600;
-            color: white;
-            letter-spacing: 0.5px;
-        }
-        
-        .content {
-            padding: 32px 24px;
-        }
-        
-        .title {
-            font-size: 36px;
-            font-weight: 600;
-            color: white;
-            margin-bottom: 16px;
-            line-height: 1.2;
-            letter-spacing: -0.5px;
-        }
-        
-        .description {
-            color: #e0e0e0;
-            margin-bottom: 32px;
-            font-size: 16px;
-            line-height: 1.5;
-        }
-        
-        .button-container {
-            padding: 0 12px;
-            margin-bottom: 32px;
-        }
-        
-        .button {
-            display: block;
-            width: 100%;
-            background: #f97316;
-            color: white;
-            padding: 16px 24px;
-            text-align: center;
-            border-radius: 8px;
-            text-decoration: none;
-            font-weight: 500;
-            font-size: 16px;
-            transition: background-color 0.2s ease;
-            box-shadow: 0 2px 8px rgba(249, 115, 22, 0.2);
-        }
-        
-        .button:hover {
-            background: #ea580c;
-        }
-        
-        .footer {
-            border-top: 1px solid #333;
-            padding: 24px;
-            background: #1a1a1a;
-        }
-        
-        .footer p {
-            color: #888;
-            font-size: 14px;
-            line-height: 1.6;
-            margin-bottom: 8px;
-        }
-        
-        .footer p:last-child {
-            margin-bottom: 0;
-        }
-        
-        .footer a {
-            color: #f97316;
-            text-decoration: none;
-            transition: color 0.2s ease;
-        }
-        
-        .footer a:hover {
-            color: #ea580c;
-        }
-        
-        @media (max-width: 600px) {
-            body {
-                padding: 8px;
-            }
-            
-            .container {
-                border-radius: 8px;
-            }
-            
-            .header {
-                padding: 20px 16px;
-            }
-            
-            .content {
-                padding: 24px 16px;
-            }
-            
-            .title {
-                font-size: 28px;
-                margin-bottom: 12px;
-            }
-            
-            .description {
-                font-size: 15px;
-                margin-bottom: 24px;
-            }
-            
-            .button-container {
-                padding: 0 8px;
-                margin-bottom: 24px;
-            }
-            
-            .footer {
-                padding: 20px 16px;
-            }
-            
-            .logo-text {
-                font-size: 20px;
-            }
-            
-            .logo-circle {
-                width: 28px;
-                height: 28px;
-            }
-        }
-        
-        @media (max-width: 400px) {
-            .title {
-                font-size: 24px;
-            }
-            
-            .button {
-                padding: 14px 20px;
-                font-size: 15px;
-            }
-        }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="header">
-            <div class="logo-container">
-                <div class="logo-circle"></div>
-                <div class="logo-text">ContactHub X50</div>
-            </div>
-        </div>
-        
-        <div class="content">
-            <h1 class="title">Password Reset Request</h1>
-            <p class="description">We received a request to reset your password. Click the button below to create a new password for your ContactHub X50 account.</p>
-            
-            <div class="button-container">
-                <a href="{{ reset_link }}" class="button">
-                    Reset Your Password
-                </a>
-            </div>
-        </div>
-        
-        <div class="footer">
-            <p><strong>Important:</strong> If you didn't request a password reset, please ignore this email and ensure your account is secure by logging in to change your password.</p>
-            <p>If you're experiencing issues, please contact <a href="#">Support</a>.</p>
-            <p>This password reset link will expire in 20 minutes for security purposes.</p>
-        </div>
-    </div>
-</body>
-</html>
-"""
+def hashing_unavailable(e):
+    response = jsonify({'error': 'Server is busy, please retry shortly'})
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response, 429
 
 @auth_bp.route('/api/register', methods=['POST'])
 def register():
@@ -249,7 +41,7 @@ def register():
         user = {
             'name': data['name'],
             'email': data['email'],
-            'password': generate_password_hash(data['password']),
+            'password': hash_password(data['password']),
             'created_at': datetime.utcnow()
         }
         
@@ -275,6 +67,8 @@ def register():
             }
         }), 200
         
+    except HashPoolSaturated as e:
+        return hashing_unavailable(e)
     except Exception as e:
         print(f"Registration error: {str(e)}")
         return jsonify({'error': 'Registration failed', 'details': str(e)}), 500
@@ -289,7 +83,7 @@ def login():
 
         user = mongo.db.users.find_one({'email': data['email']})
         
-        if not user or not check_password_hash(user['password'], data['password']):
+        if not user or not verify_and_upgrade(user, data['password']):
             return jsonify({'error': 'Invalid credentials'}), 401
 
         token = jwt.encode(
@@ -310,6 +104,8 @@ def login():
             }
         }), 200
 
+    except HashPoolSaturated as e:
+        return hashing_unavailable(e)
     except Exception as e:
         print(f"Login error: {str(e)}")
         return jsonify({'error': 'Login failed', 'details': str(e)}), 500
@@ -370,25 +166,15 @@ def forgot_password():
         # Create reset password link
         reset_link = f"{Config.FRONTEND_URL}/reset_password?token={reset_token}"
         
-        # Send email with HTML template
-        msg = Message(
+        # Queue email with HTML template for the outbox workers
+        html, body = render_reset_email(reset_link)
+        outbox.enqueue(
             'ContactHub X50 Password Reset Request',
-            sender=Config.MAIL_USERNAME,
-            recipients=[email]
+            recipients=[email],
+            html=html,
+            body=body,
+            sender=Config.MAIL_USERNAME
         )
-        msg.html = render_template_string(EMAIL_TEMPLATE, reset_link=reset_link)
-        msg.body = f'''
-ContactHub X50 Password Reset Request
-
-All you have to do is click this link and we'll sign you in securely:
-{reset_link}
-
-If you didn't request this email, you can safely ignore it.
-If you're experiencing issues, please contact support.
-
-This link will expire in 20 minutes.
-'''
-        mail.send(msg)
         
         return jsonify({'message': 'Password reset email sent successfully'}), 200
         
@@ -424,10 +210,11 @@ def reset_password():
             mongo.db.users.update_one(
                 {'_id': ObjectId(user_id)},
                 {
-                    '$set': {'password': generate_password_hash(new_password)},
+                    '$set': {'password': hash_password(new_password)},
                     '$unset': {'reset_token': ''}
                 }
             )
+            user_cache.invalidate(user_id)
             
             return jsonify({'message': 'Password reset successful'}), 200
             
@@ -436,6 +223,8 @@ def reset_password():
         except jwt.InvalidTokenError:
             return jsonify({'error': 'Invalid reset token'}), 401
             
+    except HashPoolSaturated as e:
+        return hashing_unavailable(e)
     except Exception as e:
         print(f"Reset password error: {str(e)}")
         return jsonify({'error': 'Password reset failed', 'details': str(e)}), 500
@@ -461,6 +250,7 @@ def logout():
                 {'_id': ObjectId(user_id)},
                 {'$set': {'last_logout': datetime.utcnow()}}
             )
+            user_cache.invalidate(user_id)
             
             return jsonify({'message': 'Logged out successfully'}), 200
             
@@ -499,7 +289,7 @@ def delete_account():
                 return jsonify({'error': 'User not found'}), 404
                 
             # Verify password
-            if not check_password_hash(user['password'], password):
+            if not verify_password(user['password'], password):
                 return jsonify({'error': 'Invalid password'}), 401
             
             # Create a deletion activity log before deleting activities
@@ -516,14 +306,20 @@ def delete_account():
             # 1. Delete all user's contacts
             contacts_result = mongo.db.contacts.delete_many({'user_id': user_id})
             
-            # 2. Delete all user's activity logs
+            # 2. Delete all user's activity logs, including any still queued
+            activity_log.flush()
             activities_result = mongo.db.activities.delete_many({'user_id': user_id})
             
             # 3. Delete any reset tokens or other user-related documents
             # Add more collections here if needed for future features
+            delete_user_stats(user_id)
+            invalidate_typeahead(user_id)
+            contact_cache.invalidate_user(user_id)
+            delete_user_rollups(user_id)
             
             # 4. Finally, delete the user account itself
             user_result = mongo.db.users.delete_one({'_id': user_id})
+            user_cache.invalidate(str(user_id))
             
             # Prepare deletion statistics
             deletion_stats = {
@@ -545,6 +341,8 @@ def delete_account():
         except jwt.InvalidTokenError:
             return jsonify({'error': 'Invalid token'}), 401
             
+    except HashPoolSaturated as e:
+        return hashing_unavailable(e)
     except Exception as e:
         print(f"Delete account error: {str(e)}")
         return jsonify({'error': 'Account deletion failed', 'details': str(e)}), 500
\ No newline at end of file
@@ -1,14 +1,35 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
+import queue
 from app import mongo
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 import jwt
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timezone
 from functools import wraps
 from config import Config
+from app.cache import user_cache
+from app.contact_cache import contact_cache
+from app.activity import activity_log
+from app.stats import get_user_stats, get_versions, record_contacts_added
+from app.etag import not_modified, with_etag
+from app.importer import ContactImport, iter_csv_rows, iter_ndjson_rows
+from app.exporter import EXPORT_FIELDS, export_cursor, iter_csv, iter_ndjson
+from app.events import broker, notify_activities, subscribe
+from app.search import SEARCH_FIELDS, get_typeahead_index, prefix_keys, prefix_query, typeahead_enabled
+from app.contact_api import (CONTACT_FIELDS, CONTACT_PROJECTION, ContactPage, InvalidRequest,
+                             contact_created, contact_query, contacts_etag, new_contact,
+                             recent_activities, searched_activity, stats_body, stats_etag,
+                             wants_reconcile)
 
 contacts_bp = Blueprint('contacts', __name__)
 
-def token_required(f):
+def token_required(f=None, fresh=False):
+    # fresh=True skips user_cache: routes that write contacts or activities
+    # must not act for an account deleted through another worker, whose
+    # cache entry lives on for up to USER_CACHE_TTL
+    if f is None:
+        return lambda view: token_required(view, fresh=fresh)
+    
     @wraps(f)
     def decorated(*args, **kwargs):
         token = request.headers.get('Authorization')
@@ -16,100 +37,233 @@ def token_required(f):
             return jsonify({'error': 'Token is missing'}), 401
         try:
             data = jwt.decode(token.split()[1], Config.JWT_SECRET_KEY, algorithms=['HS256'])
-            current_user = mongo.db.users.find_one({'_id': ObjectId(data['user_id'])})
-            if not current_user:
-                raise Exception('User not found')
+            current_user = None if fresh else user_cache.get(data['user_id'])
+            if current_user is None:
+                current_user = mongo.db.users.find_one({'_id': ObjectId(data['user_id'])})
+                if not current_user:
+                    user_cache.invalidate(data['user_id'])
+                    raise Exception('User not found')
+                user_cache.set(data['user_id'], current_user)
         except Exception as e:
             return jsonify({'error': 'Invalid token', 'details': str(e)}), 401
         return f(current_user, *args, **kwargs)
     return decorated
 
+def stats_snapshot(user_id, reconcile=False):
+    # Materialized counters plus the recent activities; BSON types are
+    # handled by the JSON provider
+    counters = get_user_stats(user_id, reconcile=reconcile)
+    return stats_body(counters, list(recent_activities(mongo.db, user_id)))
+
 @contacts_bp.route('/api/contacts/stats', methods=['GET'])
 @token_required
 def get_stats(current_user):
     try:
-        # Get total contacts count
-        total_contacts = mongo.db.contacts.count_documents({'user_id': current_user['_id']})
-        
-        # Get contacts added in the last 20 minutes
-        twenty_mins_ago = datetime.now(timezone.utc) - timedelta(minutes=20)
-        recent_added = mongo.db.contacts.count_documents({
-            'user_id': current_user['_id'],
-            'created_at': {'$gte': twenty_mins_ago}
-        })
-        
-        # Get recent activities with proper timestamp handling
-        recent_activities = list(mongo.db.activities.find(
-            {'user_id': current_user['_id']}
-        ).sort('timestamp', -1).limit(4))
-        
-        # Process activities to make them JSON serializable
-        processed_activities = []
-        for activity in recent_activities:
-            # Convert ObjectId to string
-            activity['_id'] = str(activity['_id'])
-            activity['user_id'] = str(activity['user_id'])
-            
-            # Process contact information if it exists
-            if 'contact' in activity and activity['contact']:
-                activity['contact']['_id'] = str(activity['contact']['_id'])
-                activity['contact']['user_id'] = str(activity['contact']['user_id'])
-            
-            # Ensure timestamp is in UTC and convert to ISO format
-            if isinstance(activity['timestamp'], datetime):
-                # Ensure the timestamp is timezone-aware
-                if activity['timestamp'].tzinfo is None:
-                    activity['timestamp'] = activity['timestamp'].replace(tzinfo=timezone.utc)
-                activity['timestamp'] = activity['timestamp'].isoformat()
-            
-            # Convert activity type
-            activity['type'] = activity['type'].replace('contact_', '')
-            
-            processed_activities.append(activity)
+        reconcile = wants_reconcile(request.args)
+        
+        # Answer unchanged polls from the version counter alone
+        etag = None
+        versions = None if reconcile else get_versions(current_user['_id'])
+        if versions is not None:
+            etag = stats_etag(current_user['_id'], versions)
+            cached = not_modified(etag)
+            if cached is not None:
+                return cached
         
-        return jsonify({
-            'total_contacts': total_contacts,
-            'recent_added': recent_added,
-            'recent_activities': processed_activities
-        }), 200
+        response = jsonify(stats_snapshot(current_user['_id'], reconcile=reconcile))
+        return with_etag(response, etag), 200
     except Exception as e:
         print(f"Error in get_stats: {str(e)}")
         return jsonify({'error': 'Failed to get stats', 'details': str(e)}), 500
 
-@contacts_bp.route('/api/contacts', methods=['POST'])
+@contacts_bp.route('/api/contacts/stats/stream', methods=['GET'])
+@token_required
+def stream_stats(current_user):
+    try:
+        user_id = current_user['_id']
+        subscription = subscribe(user_id)
+        if subscription is None:
+            return jsonify({'error': 'Too many open stats streams'}), 503
+        
+        try:
+            snapshot = stats_snapshot(user_id)
+        except Exception:
+            broker.unsubscribe(user_id, subscription)
+            raise
+        keepalive = current_app.config['STATS_STREAM_KEEPALIVE']
+        
+        def sse(event, data):
+            return f"event: {event}\ndata: {current_app.json.dumps(data)}\n\n"
+        
+        # Full snapshot once, then pushed updates; idle streams only see
+        # keepalive comments and cost no queries
+        def events():
+            yield 'retry: 5000\n\n'
+            yield sse('snapshot', snapshot)
+            while True:
+                try:
+                    event = subscription.get(timeout=keepalive)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                yield sse('stats', event)
+        
+        response = Response(
+            stream_with_context(events()),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+        response.call_on_close(lambda: broker.unsubscribe(user_id, subscription))
+        return response
+    except Exception as e:
+        print(f"Error in stream_stats: {str(e)}")
+        return jsonify({'error': 'Failed to open stats stream', 'details': str(e)}), 500
+
+@contacts_bp.route('/api/contacts', methods=['GET'])
 @token_required
+def list_contacts(current_user):
+    try:
+        # Answer unchanged pages from the version counter alone
+        etag = None
+        versions = get_versions(current_user['_id'])
+        if versions is not None:
+            etag = contacts_etag(current_user['_id'], versions, request.full_path)
+            cached = not_modified(etag)
+            if cached is not None:
+                return cached
+        
+        # Page size, field projection and keyset cursor
+        try:
+            page = ContactPage(current_user['_id'], request.args, current_app.config)
+        except InvalidRequest as e:
+            return jsonify({'error': str(e)}), 400
+        
+        contacts = list(page.cursor(mongo.db))
+        response = jsonify(page.body(contacts))
+        return with_etag(response, etag), 200
+    except Exception as e:
+        print(f"Error in list_contacts: {str(e)}")
+        return jsonify({'error': 'Failed to list contacts', 'details': str(e)}), 500
+
+@contacts_bp.route('/api/contacts', methods=['POST'])
+@token_required(fresh=True)
 def create_contact(current_user):
     try:
-        data = request.get_json()
-        contact = {
-            'user_id': current_user['_id'],
-            'mobile': data['mobile'],
-            'email': data['email'],
-            'address': data['address'],
-            'registration_number': data['registration_number'],
-            'created_at': datetime.now(timezone.utc)
-        }
+        contact = new_contact(current_user['_id'], request.get_json())
         
         result = mongo.db.contacts.insert_one(contact)
+        record_contacts_added(current_user['_id'], created_at=contact['created_at'])
         
-        # Create activity log
-        activity = {
-            'user_id': current_user['_id'],
-            'type': 'contact_added',
-            'details': f"Added contact with registration number {data['registration_number']}",
-            'timestamp': datetime.now(timezone.utc),
-            'contact': {
-                '_id': str(result.inserted_id),
-                'user_id': str(current_user['_id']),
-                **data
-            }
-        }
-        mongo.db.activities.insert_one(activity)
+        # Caches and activity log
+        activity = contact_created(current_user['_id'], contact)
+        contact_cache.put(current_user['_id'], contact)
+        activity_log.record(activity)
+        notify_activities(current_user['_id'], [activity])
         
         return jsonify({'message': 'Contact created successfully', 'contact_id': str(result.inserted_id)}), 201
+    except DuplicateKeyError:
+        return jsonify({'error': 'Contact with this registration number already exists'}), 409
     except Exception as e:
         return jsonify({'error': 'Failed to create contact', 'details': str(e)}), 500
 
+@contacts_bp.route('/api/contacts/import', methods=['POST'])
+@token_required(fresh=True)
+def import_contacts(current_user):
+    try:
+        # Pick the parser from ?format= or the request content type
+        fmt = request.args.get('format') or request.mimetype
+        if fmt in ('csv', 'text/csv'):
+            rows = iter_csv_rows(request.stream)
+        elif fmt in ('ndjson', 'application/x-ndjson', 'application/ndjson', 'application/jsonl'):
+            rows = iter_ndjson_rows(request.stream)
+        else:
+            return jsonify({'error': 'Unsupported import format, send CSV or NDJSON'}), 415
+        
+        job = ContactImport(
+            current_user['_id'],
+            chunk_size=current_app.config['IMPORT_CHUNK_SIZE'],
+            max_errors=current_app.config['IMPORT_MAX_ERRORS']
+        )
+        report = job.run(rows)
+        
+        return jsonify({'message': 'Import completed', **report}), 200
+    except Exception as e:
+        print(f"Error in import_contacts: {str(e)}")
+        return jsonify({'error': 'Import failed', 'details': str(e)}), 500
+
+@contacts_bp.route('/api/contacts/export', methods=['GET'])
+@token_required
+def export_contacts(current_user):
+    try:
+        collection = request.args.get('collection', 'contacts')
+        fmt = request.args.get('format', 'ndjson')
+        if collection not in EXPORT_FIELDS:
+            return jsonify({'error': 'Collection must be contacts or activities'}), 400
+        if fmt not in ('ndjson', 'csv'):
+            return jsonify({'error': 'Format must be ndjson or csv'}), 400
+        
+        cursor = export_cursor(collection, current_user['_id'], current_app.config['EXPORT_BATCH_SIZE'])
+        if fmt == 'csv':
+            body, mimetype = iter_csv(cursor, collection), 'text/csv'
+        else:
+            body, mimetype = iter_ndjson(cursor, collection), 'application/x-ndjson'
+        
+        filename = f"{collection}-{datetime.now(timezone.utc):%Y%m%d%H%M%S}.{fmt}"
+        return Response(
+            stream_with_context(body),
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+        )
+    except Exception as e:
+        print(f"Error in export_contacts: {str(e)}")
+        return jsonify({'error': 'Export failed', 'details': str(e)}), 500
+
+@contacts_bp.route('/api/contacts/suggest', methods=['GET'])
+@token_required
+def suggest_contacts(current_user):
+    try:
+        q = request.args.get('q', '')
+        field = request.args.get('field') or None
+        if field and field not in SEARCH_FIELDS:
+            return jsonify({'error': f"field must be one of: {', '.join(SEARCH_FIELDS)}"}), 400
+        
+        prefixes = prefix_keys(q, field)
+        if not prefixes:
+            return jsonify({'error': 'Search query is required'}), 400
+        
+        try:
+            limit = int(request.args.get('limit', current_app.config['SEARCH_RESULTS_LIMIT']))
+        except ValueError:
+            return jsonify({'error': 'limit must be an integer'}), 400
+        limit = max(1, min(limit, current_app.config['SEARCH_MAX_RESULTS']))
+        
+        projection = {name: 1 for name in CONTACT_FIELDS}
+        
+        # Large, hot contact books are answered from the in-memory type-ahead
+        # index; everyone else uses the search_keys index directly. The
+        # contact count is only read when type-ahead indexes are enabled.
+        index = None
+        if typeahead_enabled():
+            total_contacts = get_user_stats(current_user['_id'])['total_contacts']
+            index = get_typeahead_index(
+                current_user['_id'], total_contacts, current_app.config['SEARCH_TYPEAHEAD_MIN_CONTACTS']
+            )
+        if index is not None:
+            ids = index.lookup(prefixes, limit)
+            found = {c['_id']: c for c in mongo.db.contacts.find(
+                {'_id': {'$in': ids}, 'user_id': current_user['_id']}, projection
+            )}
+            contacts = [found[i] for i in ids if i in found]
+        else:
+            contacts = list(mongo.db.contacts.find(
+                prefix_query(current_user['_id'], prefixes), projection
+            ).limit(limit))
+        
+        return jsonify({'contacts': contacts}), 200
+    except Exception as e:
+        print(f"Error in suggest_contacts: {str(e)}")
+        return jsonify({'error': 'Search failed', 'details': str(e)}), 500
+
 @contacts_bp.route('/api/contacts/search', methods=['GET'])
 @token_required
 def search_contacts(current_user):
@@ -118,35 +272,65 @@ def search_contacts(current_user):
         if not reg_number:
             return jsonify({'error': 'Registration number is required'}), 400
         
-        contact = mongo.db.contacts.find_one({
-            'user_id': current_user['_id'],
-            'registration_number': reg_number
-        })
-        
-        if not contact:
-            return jsonify({'error': 'Contact not found'}), 404
+        # Repeat searches are answered from the lookup cache
+        contact = contact_cache.get(current_user['_id'], reg_number)
+        if contact is None:
+            contact = mongo.db.contacts.find_one(contact_query(current_user['_id'], reg_number), CONTACT_PROJECTION)
+            
+            if not contact:
+                return jsonify({'error': 'Contact not found'}), 404
+            contact_cache.put(current_user['_id'], contact)
         
         # Create activity log for search
-        activity = {
-            'user_id': current_user['_id'],
-            'type': 'contact_searched',
-            'details': f"Searched for contact with registration number {reg_number}",
-            'timestamp': datetime.now(timezone.utc),
-            'contact': {
-                '_id': str(contact['_id']),
-                'user_id': str(contact['user_id']),
-                'mobile': contact['mobile'],
-                'email': contact['email'],
-                'address': contact['address'],
-                'registration_number': contact['registration_number']
-            }
-        }
-        mongo.db.activities.insert_one(activity)
-        
-        # Convert ObjectId to string for JSON serialization
-        contact['_id'] = str(contact['_id'])
-        contact['user_id'] = str(contact['user_id'])
+        activity = searched_activity(current_user['_id'], contact)
+        activity_log.record(activity)
+        notify_activities(current_user['_id'], [activity])
         
         return jsonify(contact), 200
     except Exception as e:
         return jsonify({'error': 'Search failed', 'details': str(e)}), 500
+
+@contacts_bp.route('/api/contacts/lookup', methods=['POST'])
+@token_required(fresh=True)
+def lookup_contacts(current_user):
+    try:
+        data = request.get_json(silent=True) or {}
+        numbers = data.get('registration_numbers')
+        if not isinstance(numbers, list) or not numbers:
+            return jsonify({'error': 'registration_numbers must be a non-empty list'}), 400
+        if not all(isinstance(n, str) and n for n in numbers):
+            return jsonify({'error': 'registration_numbers must be strings'}), 400
+        
+        numbers = list(dict.fromkeys(numbers))
+        if len(numbers) > current_app.config['CONTACTS_LOOKUP_MAX']:
+            return jsonify({'error': f"At most {current_app.config['CONTACTS_LOOKUP_MAX']} registration numbers per lookup"}), 400
+        
+        # Cached contacts first, then one $in query for the rest
+        user_id = current_user['_id']
+        found = {}
+        for number in numbers:
+            contact = contact_cache.get(user_id, number)
+            if contact is not None:
+                found[number] = contact
+        uncached = [n for n in numbers if n not in found]
+        if uncached:
+            for contact in mongo.db.contacts.find(
+                contact_query(user_id, {'$in': uncached}),
+                CONTACT_PROJECTION
+            ):
+                found[contact['registration_number']] = contact
+                contact_cache.put(user_id, contact)
+        
+        contacts = [found[n] for n in numbers if n in found]
+        missing = [n for n in numbers if n not in found]
+        
+        # One search activity per contact found, written as one batch
+        now = datetime.now(timezone.utc)
+        activities = [searched_activity(user_id, contact, now) for contact in contacts]
+        activity_log.record_many(activities)
+        notify_activities(user_id, activities)
+        
+        return jsonify({'found': contacts, 'missing': missing}), 200
+    except Exception as e:
+        print(f"Error in lookup_contacts: {str(e)}")
+        return jsonify({'error': 'Lookup failed', 'details': str(e)}), 500
@@ -0,0 +1,162 @@
+import re
+import threading
+from bisect import bisect_left, bisect_right
+from pymongo import UpdateOne
+from app import mongo
+from app.cache import TTLCache
+
+# Each contact carries precomputed, normalized search keys written with the
+# contact itself, e.g. ['r:KCA123', 'm:254712345678', 'e:jane@example.com'].
+# The (user_id, search_keys) multikey index turns an anchored prefix regex
+# on those keys into a bounded index range scan.
+SEARCH_FIELDS = {
+    'registration_number': 'r',
+    'mobile': 'm',
+    'email': 'e',
+}
+
+
+def normalize(field, value):
+    value = str(value or '')
+    if field == 'registration_number':
+        return re.sub(r'[^0-9A-Z]', '', value.upper())
+    if field == 'mobile':
+        return re.sub(r'\D', '', value)
+    return value.strip().lower()
+
+
+def search_keys(contact):
+    keys = []
+    for field, tag in SEARCH_FIELDS.items():
+        normalized = normalize(field, contact.get(field))
+        if normalized:
+            keys.append(f'{tag}:{normalized}')
+    return keys
+
+
+def prefix_keys(q, field=None):
+    # Search key prefixes for a query, across all fields when none is given
+    fields = [field] if field else list(SEARCH_FIELDS)
+    prefixes = []
+    for name in fields:
+        normalized = normalize(name, q)
+        if normalized:
+            prefixes.append(f'{SEARCH_FIELDS[name]}:{normalized}')
+    return prefixes
+
+
+def prefix_query(user_id, prefixes):
+    return {
+        'user_id': user_id,
+        'search_keys': {'$in': [re.compile('^' + re.escape(prefix)) for prefix in prefixes]}
+    }
+
+
+class TypeaheadIndex:
+    # Sorted in-memory copy of one user's search keys. A prefix lookup is a
+    # bisect plus a short forward walk, independent of the number of contacts.
+
+    # Above this many new entries a merge is cheaper than one insert each
+    MERGE_THRESHOLD = 64
+
+    def __init__(self, entries):
+        entries = sorted(entries)
+        self.keys = [key for key, _ in entries]
+        self.ids = [contact_id for _, contact_id in entries]
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, user_id):
+        cursor = mongo.db.contacts.find({'user_id': user_id}, {'search_keys': 1}).batch_size(5000)
+        return cls(cls.entries(cursor))
+
+    @staticmethod
+    def entries(contacts):
+        return [(key, contact['_id']) for contact in contacts for key in contact.get('search_keys') or ()]
+
+    def add(self, entries):
+        # New contacts go into the live index instead of forcing a rebuild;
+        # the lock keeps keys and ids aligned for concurrent lookups
+        entries = sorted(entries)
+        with self._lock:
+            if len(entries) > self.MERGE_THRESHOLD:
+                # Sorting two sorted runs is a linear merge
+                merged = sorted(list(zip(self.keys, self.ids)) + entries)
+                self.keys = [key for key, _ in merged]
+                self.ids = [contact_id for _, contact_id in merged]
+                return
+            for key, contact_id in entries:
+                i = bisect_right(self.keys, key)
+                self.keys.insert(i, key)
+                self.ids.insert(i, contact_id)
+
+    def lookup(self, prefixes, limit):
+        found = []
+        with self._lock:
+            for prefix in prefixes:
+                i = bisect_left(self.keys, prefix)
+                while i < len(self.keys) and self.keys[i].startswith(prefix):
+                    if self.ids[i] not in found:
+                        found.append(self.ids[i])
+                        if len(found) >= limit:
+                            return found
+                    i += 1
+        return found
+
+    def __len__(self):
+        return len(self.keys)
+
+
+# Type-ahead indexes for the most recently active large contact books.
+# Disabled unless SEARCH_TYPEAHEAD_USERS > 0.
+typeahead_indexes = TTLCache(maxsize=0, ttl=300)
+
+
+def configure_search(config):
+    typeahead_indexes.maxsize = config.get('SEARCH_TYPEAHEAD_USERS', typeahead_indexes.maxsize)
+    typeahead_indexes.ttl = config.get('SEARCH_TYPEAHEAD_TTL', typeahead_indexes.ttl)
+
+
+def typeahead_enabled():
+    return typeahead_indexes.maxsize > 0
+
+
+def get_typeahead_index(user_id, total_contacts, min_contacts):
+    if typeahead_indexes.maxsize <= 0 or total_contacts < min_contacts:
+        return None
+    index = typeahead_indexes.get(user_id)
+    if index is None:
+        index = TypeaheadIndex.build(user_id)
+        typeahead_indexes.set(user_id, index)
+    return index
+
+
+def add_to_typeahead(user_id, contacts):
+    # Only an index that is already built needs the new contacts
+    if typeahead_indexes.maxsize <= 0:
+        return
+    index = typeahead_indexes.get(user_id)
+    if index is not None:
+        index.add(TypeaheadIndex.entries(contacts))
+
+
+def invalidate_typeahead(user_id):
+    typeahead_indexes.invalidate(user_id)
+
+
+def backfill_search_keys(batch_size=1000):
+    # Add search keys to contacts written before they existed
+    updated = 0
+    batch = []
+    cursor = mongo.db.contacts.find(
+        {'search_keys': {'$exists': False}},
+        {field: 1 for field in SEARCH_FIELDS}
+    ).batch_size(batch_size)
+    for contact in cursor:
+        batch.append(UpdateOne({'_id': contact['_id']}, {'$set': {'search_keys': search_keys(contact)}}))
+        if len(batch) >= batch_size:
+            updated += mongo.db.contacts.bulk_write(batch, ordered=False).modified_count
+            batch = []
+    if batch:
+        updated += mongo.db.contacts.bulk_write(batch, ordered=False).modified_count
+    return updated
@@ -0,0 +1,75 @@
+import uuid
+from datetime import date, datetime, timezone
+from bson import Decimal128, ObjectId
+from flask.json.provider import DefaultJSONProvider
+from pymongo.command_cursor import CommandCursor
+from pymongo.cursor import Cursor
+
+try:
+    import orjson
+except ImportError:  # optional fast backend
+    orjson = None
+
+
+def bson_default(o):
+    # Types json/orjson cannot encode on their own
+    if isinstance(o, ObjectId):
+        return str(o)
+    if isinstance(o, datetime):
+        # PyMongo returns naive datetimes that are UTC
+        if o.tzinfo is None:
+            o = o.replace(tzinfo=timezone.utc)
+        return o.isoformat()
+    if isinstance(o, date):
+        return o.isoformat()
+    if isinstance(o, Decimal128):
+        return str(o.to_decimal())
+    if isinstance(o, uuid.UUID):
+        return str(o)
+    if isinstance(o, (Cursor, CommandCursor)):
+        return list(o)
+    return DefaultJSONProvider.default(o)
+
+
+class MongoJSONProvider(DefaultJSONProvider):
+    # JSON provider that understands BSON types, so routes can jsonify
+    # documents, projections and cursors without converting fields by hand.
+    # Uses orjson when it is installed and JSON_BACKEND allows it.
+
+    default = staticmethod(bson_default)
+
+    def __init__(self, app):
+        super().__init__(app)
+        backend = app.config.get('JSON_BACKEND', 'auto')
+        if backend == 'orjson' and orjson is None:
+            raise RuntimeError('JSON_BACKEND is orjson but orjson is not installed')
+        self.use_orjson = orjson is not None and backend in ('auto', 'orjson')
+
+    def _orjson_option(self, indent=False):
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_NAIVE_UTC
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps(self, obj, **kwargs):
+        if self.use_orjson and set(kwargs) <= {'default', 'sort_keys', 'ensure_ascii', 'separators', 'indent'}:
+            return orjson.dumps(
+                obj, default=kwargs.get('default', self.default),
+                option=self._orjson_option(indent=bool(kwargs.get('indent')))
+            ).decode()
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if self.use_orjson and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        if not self.use_orjson:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        body = orjson.dumps(obj, default=self.default, option=self._orjson_option(indent=indent))
+        return self._app.response_class(body + b'\n', mimetype=self.mimetype)
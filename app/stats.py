@@ -0,0 +1,142 @@
+from datetime import datetime, timedelta, timezone
+from pymongo import ReturnDocument
+from app import mongo
+
+# Per-user stats are kept in a single `user_stats` document keyed by the
+# user's _id, so /api/contacts/stats no longer scans `contacts`:
+#
+#   {'_id': user_id, 'total_contacts': int,
+#    'recent_buckets': {'<epoch minute>': int, ...}, 'updated_at': datetime,
+#    'version': int, 'contacts_version': int}
+#
+# recent_buckets is a rolling series of per-minute addition counts; only
+# buckets inside RECENT_WINDOW are summed and older ones are pruned on read.
+# `version` changes whenever anything shown on the stats endpoint changes
+# and `contacts_version` whenever the user's contacts change; both feed the
+# ETags of the read endpoints.
+
+BUCKET_SECONDS = 60
+RECENT_WINDOW = timedelta(minutes=20)
+
+
+def _bucket(moment):
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp()) // BUCKET_SECONDS
+
+
+def contacts_added_update(count, created_at=None):
+    created_at = created_at or datetime.now(timezone.utc)
+    return {
+        '$inc': {
+            'total_contacts': count,
+            f'recent_buckets.{_bucket(created_at)}': count,
+            'version': 1,
+            'contacts_version': 1
+        },
+        '$set': {'updated_at': datetime.now(timezone.utc)}
+    }
+
+
+def record_contacts_added(user_id, count=1, created_at=None):
+    if count <= 0:
+        return
+    result = mongo.db.user_stats.update_one(
+        {'_id': user_id},
+        contacts_added_update(count, created_at)
+    )
+    if result.matched_count == 0:
+        # No counters yet, build them from the contacts themselves
+        reconcile_user_stats(user_id)
+
+
+def bump_versions(user_ids):
+    # Mark the stats of these users as changed, e.g. after new activities
+    # became visible. Users without a stats document are skipped; their
+    # first stats read creates one.
+    user_ids = list(set(user_ids))
+    if user_ids:
+        mongo.db.user_stats.update_many(
+            {'_id': {'$in': user_ids}},
+            {'$inc': {'version': 1}}
+        )
+
+
+# What the read endpoints need to build their ETags
+VERSIONS_PROJECTION = {'version': 1, 'contacts_version': 1, 'recent_buckets': 1}
+
+
+def get_versions(user_id):
+    return mongo.db.user_stats.find_one({'_id': user_id}, VERSIONS_PROJECTION)
+
+
+def recent_bucket_keys(doc):
+    # Without a version change, recent_added only moves when one of these
+    # buckets leaves the window, so a user with no recent additions keeps
+    # the same value
+    cutoff = _bucket(datetime.now(timezone.utc) - RECENT_WINDOW)
+    return sorted(key for key in (doc.get('recent_buckets') or {}) if int(key) >= cutoff)
+
+
+def delete_user_stats(user_id):
+    mongo.db.user_stats.delete_one({'_id': user_id})
+
+
+def reconcile_user_stats(user_id):
+    # Rebuild the document from a full recount of the user's contacts
+    now = datetime.now(timezone.utc)
+    total_contacts = mongo.db.contacts.count_documents({'user_id': user_id})
+    recent = mongo.db.contacts.find(
+        {'user_id': user_id, 'created_at': {'$gte': now - RECENT_WINDOW}},
+        {'created_at': 1, '_id': 0}
+    )
+    buckets = {}
+    for contact in recent:
+        key = str(_bucket(contact['created_at']))
+        buckets[key] = buckets.get(key, 0) + 1
+
+    doc = {
+        'total_contacts': total_contacts,
+        'recent_buckets': buckets,
+        'updated_at': now
+    }
+    # Versions keep counting up so earlier ETags never match again
+    return mongo.db.user_stats.find_one_and_update(
+        {'_id': user_id},
+        {'$set': doc, '$inc': {'version': 1, 'contacts_version': 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def get_user_stats(user_id, reconcile=False):
+    doc = None if reconcile else mongo.db.user_stats.find_one({'_id': user_id})
+    if doc is None or 'total_contacts' not in doc:
+        # First read for users created before stats were materialized
+        doc = reconcile_user_stats(user_id)
+
+    stats, stale = summarize_stats(doc)
+    if stale:
+        mongo.db.user_stats.update_one({'_id': user_id}, prune_buckets_update(stale))
+    return stats
+
+
+def prune_buckets_update(stale):
+    return {'$unset': {f'recent_buckets.{key}': '' for key in stale}}
+
+
+def summarize_stats(doc):
+    # Returns the counters and the bucket keys that fell out of the window
+    cutoff = _bucket(datetime.now(timezone.utc) - RECENT_WINDOW)
+    recent_added = 0
+    stale = []
+    for key, count in (doc.get('recent_buckets') or {}).items():
+        if int(key) >= cutoff:
+            recent_added += count
+        else:
+            stale.append(key)
+
+    return {
+        'total_contacts': doc.get('total_contacts', 0),
+        'recent_added': recent_added
+    }, stale
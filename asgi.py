@@ -0,0 +1,5 @@
+from app import create_app
+
+# ASGI entry point: uvicorn asgi:app --workers 4
+# or gunicorn asgi:app -k uvicorn.workers.UvicornWorker
+app = create_app(asgi=True)
@@ -0,0 +1,339 @@
+# Load test for the auth and contacts APIs.
+#
+#   python -m benchmarks.api_load [--mongo-uri memory|mongodb://localhost/bench]
+#       [--users 20] [--contacts 500] [--concurrency 1,4,16] [--requests 400]
+#       [--scenario login --scenario get_stats ...] [--output results.json]
+#       [--baseline baseline.json] [--tolerance 0.15]
+#   python -m benchmarks.api_load --compare results.json --baseline baseline.json
+#   python -m benchmarks.api_load --url http://127.0.0.1:5000 ...
+#
+# Seeds users and contacts through the API (register + NDJSON import), then
+# runs every scenario at every concurrency level with one thread per
+# concurrent client and reports throughput and p50/p95/p99 latency.
+# By default requests go through the Flask test client of create_app()
+# against an in-memory mongomock database; --mongo-uri points it at a real
+# mongod (use a throwaway database, it is dropped first) and --url drives a
+# running server over HTTP instead. In-process numbers include the load
+# generator sharing the GIL with the app, so compare runs of the same mode.
+#
+# With --baseline, results are compared against an earlier JSON file and
+# the exit status is 1 when a scenario's p95 grew or its throughput dropped
+# by more than --tolerance.
+import argparse
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timezone
+
+SCENARIOS = ('login', 'create_contact', 'search_contacts', 'get_stats')
+PASSWORD = 'bench-password-1'
+
+
+class AppClient:
+    # In-process client; Flask test clients are cheap, one per thread
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, path, headers=None, json_body=None, data=None, content_type=None):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, headers=headers, json=json_body,
+                               data=data, content_type=content_type)
+        return response.status_code, response.get_json(silent=True)
+
+
+class HttpClient:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def request(self, method, path, headers=None, json_body=None, data=None, content_type=None):
+        headers = dict(headers or {})
+        if json_body is not None:
+            data = json.dumps(json_body).encode()
+            content_type = 'application/json'
+        if content_type:
+            headers['Content-Type'] = content_type
+        req = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(req) as response:
+                status, body = response.status, response.read()
+        except urllib.error.HTTPError as e:
+            status, body = e.code, e.read()
+        try:
+            return status, json.loads(body) if body else None
+        except ValueError:
+            return status, None
+
+
+def patch_mongomock(mongomock):
+    # Two gaps between mongomock and the real driver the app relies on:
+    # its bulk builder predates the `sort` argument newer PyMongo passes
+    # for UpdateOne/ReplaceOne (never set by the app, dropped here), and
+    # find() pops '_id' from the caller's projection dict, which corrupts
+    # shared projection constants and races between threads
+    import inspect
+    from mongomock.collection import BulkOperationBuilder, Collection
+    for name in ('add_update', 'add_replace'):
+        method = getattr(BulkOperationBuilder, name)
+        if 'sort' not in inspect.signature(method).parameters:
+            def accept_sort(self, *args, _method=method, sort=None, **kwargs):
+                return _method(self, *args, **kwargs)
+            setattr(BulkOperationBuilder, name, accept_sort)
+
+    copy_only_fields = Collection._copy_only_fields
+
+    def copy_projection(self, doc, fields, container):
+        return copy_only_fields(self, doc, dict(fields) if isinstance(fields, dict) else fields, container)
+    Collection._copy_only_fields = copy_projection
+
+
+def make_app(mongo_uri):
+    # Config is read at import time, so the environment is set up first
+    memory = mongo_uri == 'memory'
+    os.environ['MONGO_URI'] = 'mongodb://localhost:27017/contacthub_bench' if memory else mongo_uri
+    os.environ['MONGO_ENSURE_INDEXES'] = 'false'
+    os.environ.setdefault('REQUEST_LOG', 'false')
+    os.environ.setdefault('MAIL_OUTBOX_WORKERS', '0')
+
+    from app import create_app, mongo
+    from app.indexes import ensure_indexes
+    from app.retention import retention_indexes
+
+    app = create_app()
+    if memory:
+        try:
+            import mongomock
+        except ImportError:
+            sys.exit('The in-memory database needs mongomock: pip install mongomock')
+        patch_mongomock(mongomock)
+        mongo.cx = mongomock.MongoClient()
+        mongo.db = mongo.cx.contacthub_bench
+    else:
+        mongo.cx.drop_database(mongo.db.name)
+    ensure_indexes(mongo.db, extra=retention_indexes(app.config))
+    return app
+
+
+def seed(client, users, contacts):
+    # Returns [(email, token, [registration numbers])]
+    seeded = []
+    for u in range(users):
+        email = f'bench-user-{u}@example.com'
+        status, body = client.request('POST', '/api/register', json_body={
+            'name': f'Bench User {u}', 'email': email, 'password': PASSWORD
+        })
+        if status != 200:
+            status, body = client.request('POST', '/api/login', json_body={'email': email, 'password': PASSWORD})
+        if status != 200:
+            sys.exit(f'Could not create or log in {email}: {status} {body}')
+        token = body['token']
+
+        numbers = [f'U{u}-REG-{i:06d}' for i in range(contacts)]
+        rows = '\n'.join(json.dumps({
+            'registration_number': number,
+            'mobile': f'07{u:02d}{i:06d}',
+            'email': f'contact{i}.user{u}@example.com',
+            'address': f'{i} Moi Avenue, Nairobi'
+        }) for i, number in enumerate(numbers))
+        if rows:
+            status, body = client.request(
+                'POST', '/api/contacts/import?format=ndjson',
+                headers={'Authorization': f'Bearer {token}'},
+                data=rows.encode(), content_type='application/x-ndjson'
+            )
+            if status != 200:
+                sys.exit(f'Seeding contacts failed: {status} {body}')
+        seeded.append((email, token, numbers))
+    return seeded
+
+
+def scenario_requests(name, seeded):
+    # Returns a function producing the next (method, path, headers, json)
+    sequence = itertools.count()
+    rng = random.Random(42)
+
+    def auth(token):
+        return {'Authorization': f'Bearer {token}'}
+
+    if name == 'login':
+        return lambda: ('POST', '/api/login', None, {'email': rng.choice(seeded)[0], 'password': PASSWORD})
+    if name == 'create_contact':
+        def create():
+            n = next(sequence)
+            email, token, _ = rng.choice(seeded)
+            return ('POST', '/api/contacts', auth(token), {
+                'registration_number': f'NEW-{os.getpid()}-{time.time_ns()}-{n}',
+                'mobile': f'0799{n:06d}',
+                'email': f'new{n}@example.com',
+                'address': f'{n} Kenyatta Avenue, Nairobi'
+            })
+        return create
+    if name == 'search_contacts':
+        def search():
+            email, token, numbers = rng.choice(seeded)
+            return ('GET', f'/api/contacts/search?registration_number={rng.choice(numbers)}', auth(token), None)
+        return search
+    if name == 'get_stats':
+        return lambda: ('GET', '/api/contacts/stats', auth(rng.choice(seeded)[1]), None)
+    raise ValueError(f'Unknown scenario: {name}')
+
+
+def percentile(values, q):
+    # Nearest-rank percentile of sorted values
+    return values[max(0, math.ceil(q * len(values)) - 1)]
+
+
+def run_level(client, next_request, concurrency, total):
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    remaining = itertools.count()
+
+    def worker():
+        mine, failed = [], []
+        while next(remaining) < total:
+            with lock:
+                method, path, headers, body = next_request()
+            started = time.perf_counter()
+            status, _ = client.request(method, path, headers=headers, json_body=body)
+            mine.append(time.perf_counter() - started)
+            if status >= 400:
+                failed.append(status)
+        with lock:
+            latencies.extend(mine)
+            errors.extend(failed)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'error_statuses': sorted(set(errors)),
+        'seconds': round(elapsed, 4),
+        'throughput_rps': round(len(latencies) / elapsed, 2),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'max_ms': round(latencies[-1] * 1000, 3)
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, tolerance):
+    # Returns the list of regressions and prints a side by side table
+    regressions = []
+    print(f"\n{'scenario':<16} {'conc':>4} {'p95 ms':>18} {'req/s':>20}")
+    for name, levels in results['results'].items():
+        for level, current in levels.items():
+            previous = baseline.get('results', {}).get(name, {}).get(level)
+            if previous is None:
+                continue
+            p95_change = current['p95_ms'] / previous['p95_ms'] - 1 if previous['p95_ms'] else 0.0
+            rps_change = current['throughput_rps'] / previous['throughput_rps'] - 1 if previous['throughput_rps'] else 0.0
+            flag = ''
+            if p95_change > tolerance or rps_change < -tolerance:
+                flag = '  REGRESSION'
+                regressions.append((name, level, p95_change, rps_change))
+            print(f"{name:<16} {level:>4} {previous['p95_ms']:8.2f} -> {current['p95_ms']:7.2f} "
+                  f"{previous['throughput_rps']:9.1f} -> {current['throughput_rps']:8.1f}"
+                  f"  ({p95_change:+.0%} p95, {rps_change:+.0%} req/s){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Auth and contacts API load test')
+    parser.add_argument('--mongo-uri', default=os.getenv('BENCH_MONGO_URI', 'memory'),
+                        help="'memory' for mongomock or a mongodb:// URI of a throwaway database")
+    parser.add_argument('--url', help='Drive a running server over HTTP instead of create_app()')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--contacts', type=int, default=500, help='Contacts seeded per user')
+    parser.add_argument('--concurrency', default='1,4,16', help='Comma separated client counts')
+    parser.add_argument('--requests', type=int, default=400, help='Requests per scenario and level')
+    parser.add_argument('--warmup', type=int, default=20, help='Unmeasured requests before each scenario')
+    parser.add_argument('--scenario', action='append', choices=SCENARIOS, help='Repeatable, default all')
+    parser.add_argument('--output', help='Write the results as JSON')
+    parser.add_argument('--baseline', help='Earlier results to compare against')
+    parser.add_argument('--compare', help='Compare this results file with --baseline without running')
+    parser.add_argument('--tolerance', type=float, default=0.15)
+    args = parser.parse_args()
+
+    if args.compare:
+        if not args.baseline:
+            parser.error('--compare needs --baseline')
+        with open(args.compare) as f, open(args.baseline) as g:
+            regressions = compare(json.load(f), json.load(g), args.tolerance)
+        sys.exit(1 if regressions else 0)
+
+    client = HttpClient(args.url) if args.url else AppClient(make_app(args.mongo_uri))
+    levels = [int(level) for level in args.concurrency.split(',')]
+    scenarios = args.scenario or list(SCENARIOS)
+
+    started = time.perf_counter()
+    seeded = seed(client, args.users, args.contacts)
+    print(f"Seeded {args.users} users x {args.contacts} contacts in {time.perf_counter() - started:.1f}s")
+
+    results = {
+        'meta': {
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+            'target': args.url or args.mongo_uri,
+            'users': args.users,
+            'contacts_per_user': args.contacts,
+            'requests_per_level': args.requests
+        },
+        'results': {}
+    }
+
+    print(f"\n{'scenario':<16} {'conc':>4} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6}")
+    for name in scenarios:
+        next_request = scenario_requests(name, seeded)
+        if args.warmup:
+            run_level(client, next_request, 1, args.warmup)
+        for level in levels:
+            stats = run_level(client, next_request, level, args.requests)
+            results['results'].setdefault(name, {})[str(level)] = stats
+            print(f"{name:<16} {level:>4} {stats['throughput_rps']:9.1f} {stats['p50_ms']:8.2f} "
+                  f"{stats['p95_ms']:8.2f} {stats['p99_ms']:8.2f} {stats['errors']:>6}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nWrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+# Micro-benchmark for the password-reset email rendering.
+#
+#   python -m benchmarks.email_render [--number 2000]
+#
+# "before" is the previous per-request render_template_string call plus the
+# f-string plaintext body, "after" is the cached ResetEmailTemplate.
+import argparse
+import timeit
+from flask import Flask, render_template_string
+from app.emails import EMAIL_TEMPLATE, get_reset_email_template, render_reset_email
+
+RESET_LINK = 'https://contacthub.example/reset_password?token=eyJhbGciOiJIUzI1NiJ9.payload.signature'
+
+
+def render_before(reset_link):
+    html = render_template_string(EMAIL_TEMPLATE, reset_link=reset_link)
+    body = f'''
+ContactHub X50 Password Reset Request
+
+All you have to do is click this link and we'll sign you in securely:
+{reset_link}
+
+If you didn't request this email, you can safely ignore it.
+If you're experiencing issues, please contact support.
+
+This link will expire in 20 minutes.
+'''
+    return html, body
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Password-reset email render benchmark')
+    parser.add_argument('--number', type=int, default=2000)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    with app.app_context():
+        # Warm both paths so one-off setup is not counted
+        render_before(RESET_LINK)
+        get_reset_email_template()
+
+        before = min(timeit.repeat(lambda: render_before(RESET_LINK), number=args.number, repeat=3))
+        after = min(timeit.repeat(lambda: render_reset_email(RESET_LINK), number=args.number, repeat=3))
+
+        html_before, _ = render_before(RESET_LINK)
+        html_after, _ = render_reset_email(RESET_LINK)
+    print(f"before: {before / args.number * 1e6:9.2f} us/render  ({len(html_before)} bytes)")
+    print(f"after:  {after / args.number * 1e6:9.2f} us/render  ({len(html_after)} bytes)")
+    print(f"speedup: {before / after:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
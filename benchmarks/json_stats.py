@@ -0,0 +1,91 @@
+# Benchmark for serializing get_stats style responses.
+#
+#   python -m benchmarks.json_stats [--activities 1000] [--number 50]
+#
+# "manual" is the previous per-field ObjectId/datetime conversion followed by
+# the stdlib encoder, the others hand raw documents to MongoJSONProvider.
+import argparse
+import copy
+import json
+import timeit
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
+from flask import Flask
+from app.serialization import MongoJSONProvider, orjson
+
+
+def make_activities(count):
+    user_id = ObjectId()
+    now = datetime.utcnow()
+    activities = []
+    for i in range(count):
+        activities.append({
+            '_id': ObjectId(),
+            'user_id': user_id,
+            'type': 'contact_searched',
+            'details': f'Searched for contact with registration number KCA-{i:06d}',
+            'timestamp': now - timedelta(seconds=i),
+            'contact': {
+                '_id': ObjectId(),
+                'user_id': user_id,
+                'mobile': f'07{i:08d}',
+                'email': f'contact{i}@example.com',
+                'address': f'{i} Moi Avenue, Nairobi, Kenya',
+                'registration_number': f'KCA-{i:06d}'
+            }
+        })
+    return activities
+
+
+def manual(activities):
+    processed = []
+    for activity in activities:
+        activity['_id'] = str(activity['_id'])
+        activity['user_id'] = str(activity['user_id'])
+        if 'contact' in activity and activity['contact']:
+            activity['contact']['_id'] = str(activity['contact']['_id'])
+            activity['contact']['user_id'] = str(activity['contact']['user_id'])
+        if isinstance(activity['timestamp'], datetime):
+            if activity['timestamp'].tzinfo is None:
+                activity['timestamp'] = activity['timestamp'].replace(tzinfo=timezone.utc)
+            activity['timestamp'] = activity['timestamp'].isoformat()
+        processed.append(activity)
+    return json.dumps({'recent_activities': processed}, separators=(',', ':'), sort_keys=True)
+
+
+def provider_for(backend):
+    app = Flask(__name__)
+    app.config['JSON_BACKEND'] = backend
+    return MongoJSONProvider(app)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stats response serialization benchmark')
+    parser.add_argument('--activities', type=int, default=1000)
+    parser.add_argument('--number', type=int, default=50)
+    args = parser.parse_args()
+
+    activities = make_activities(args.activities)
+    candidates = [('manual + json', manual)]
+    stdlib = provider_for('json')
+    candidates.append(('provider json', lambda docs: stdlib.dumps({'recent_activities': docs})))
+    if orjson is not None:
+        fast = provider_for('orjson')
+        candidates.append(('provider orjson', lambda docs: fast.dumps({'recent_activities': docs})))
+
+    print(f"{args.activities} activities per response")
+    baseline = None
+    for name, fn in candidates:
+        # The manual path mutates its input, so every run gets a fresh copy
+        # made outside the timed section
+        runs = []
+        for _ in range(args.number):
+            docs = copy.deepcopy(activities)
+            runs.append(timeit.timeit(lambda: fn(docs), number=1))
+        seconds = min(runs)
+        baseline = baseline or seconds
+        print(f"{name:<16} {seconds * 1e3:8.3f} ms/response  {baseline / seconds:5.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+# Password hashing throughput, used to size workers for login traffic.
+#
+#   python -m benchmarks.password_hashing [--seconds 2] [--processes N]
+#       [--scheme bcrypt:12 --scheme scrypt:32768 --scheme pbkdf2:600000]
+#
+# Each scheme is hashed in a tight loop on one core, then optionally in N
+# processes at once to show how throughput scales across cores. Login cost
+# is one verify, which costs the same as one hash.
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from app.passwords import PasswordHasher
+
+DEFAULT_SCHEMES = ['scrypt:32768', 'pbkdf2:600000', 'bcrypt:10', 'bcrypt:12']
+
+
+def make_hasher(scheme):
+    algorithm, _, cost = scheme.partition(':')
+    hasher = PasswordHasher(algorithm=algorithm)
+    if cost:
+        if algorithm == 'bcrypt':
+            hasher.bcrypt_rounds = int(cost)
+        elif algorithm == 'pbkdf2':
+            hasher.pbkdf2_iterations = int(cost)
+        else:
+            hasher.scrypt_n = int(cost)
+    return hasher
+
+
+def hashes_per_second(scheme, seconds):
+    hasher = make_hasher(scheme)
+    count = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        hasher.hash('correct horse battery staple')
+        count += 1
+    return count / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Password hashing throughput benchmark')
+    parser.add_argument('--scheme', action='append', help='algorithm:cost, repeatable')
+    parser.add_argument('--seconds', type=float, default=2.0)
+    parser.add_argument('--processes', type=int, default=0, help='Also run N processes in parallel')
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs available")
+    for scheme in args.scheme or DEFAULT_SCHEMES:
+        single = hashes_per_second(scheme, args.seconds)
+        line = f"{scheme:<16} {single:8.1f} hashes/s/core  {1000 / single:7.1f} ms/hash"
+        if args.processes > 1:
+            with ProcessPoolExecutor(args.processes) as pool:
+                rates = list(pool.map(hashes_per_second, [scheme] * args.processes, [args.seconds] * args.processes))
+            line += f"  {sum(rates):8.1f} hashes/s with {args.processes} processes"
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
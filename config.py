@@ -8,18 +8,172 @@ load_dotenv()
 class Config:
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key')
     MONGO_URI = os.getenv('MONGO_URI')
+    MONGO_ENSURE_INDEXES = os.getenv('MONGO_ENSURE_INDEXES', 'true').lower() == 'true'
     
-    # Mail settings
-    MAIL_SERVER = 'smtp.gmail.com'
-    MAIL_PORT = 587
-    MAIL_USE_TLS = True
+    # Mongo connection pool, per client and process. A request waits at most
+    # MONGO_WAIT_QUEUE_TIMEOUT_MS for a free connection (0 waits until the
+    # server selection timeout). MONGO_COMPRESSORS is a comma separated list
+    # such as 'zstd,zlib'.
+    MONGO_MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', 100))
+    MONGO_MIN_POOL_SIZE = int(os.getenv('MONGO_MIN_POOL_SIZE', 0))
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('MONGO_WAIT_QUEUE_TIMEOUT_MS', 2000))
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000))
+    MONGO_COMPRESSORS = os.getenv('MONGO_COMPRESSORS', '')
+    MONGO_READ_PREFERENCE = os.getenv('MONGO_READ_PREFERENCE', 'primary')
+    
+    # Bearer token for the operational endpoints under /api/admin and
+    # /metrics; when unset they answer 403. METRICS_PUBLIC=true serves
+    # /metrics without the token, for scrapers on a private network.
+    ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+    METRICS_PUBLIC = os.getenv('METRICS_PUBLIC', 'false').lower() == 'true'
+    
+    # Request instrumentation: one JSON log line per request on stderr and
+    # a Server-Timing header with the Mongo/hashing/Python split
+    REQUEST_LOG = os.getenv('REQUEST_LOG', 'true').lower() == 'true'
+    SERVER_TIMING = os.getenv('SERVER_TIMING', 'true').lower() == 'true'
+    
+    # On-demand sampling profiler (/api/admin/profile, needs ADMIN_TOKEN).
+    # Collapsed stacks are written to PROFILE_DIR. PROFILE_SIGNAL (e.g.
+    # SIGUSR2) lets `kill -USR2 <worker pid>` start a PROFILE_SIGNAL_SECONDS
+    # profile of a serve.py worker.
+    PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+    PROFILE_INTERVAL_MS = float(os.getenv('PROFILE_INTERVAL_MS', 5))
+    PROFILE_MAX_SECONDS = float(os.getenv('PROFILE_MAX_SECONDS', 120))
+    PROFILE_SIGNAL = os.getenv('PROFILE_SIGNAL', '')
+    PROFILE_SIGNAL_SECONDS = float(os.getenv('PROFILE_SIGNAL_SECONDS', 30))
+    
+    # Mail settings (point MAIL_SERVER/MAIL_PORT at a local debugging SMTP
+    # server such as `python -m aiosmtpd -n -l localhost:1025` with
+    # MAIL_USE_TLS=false to test without delivering mail)
+    MAIL_SERVER = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
+    MAIL_PORT = int(os.getenv('MAIL_PORT', 587))
+    MAIL_USE_TLS = os.getenv('MAIL_USE_TLS', 'true').lower() == 'true'
     MAIL_USERNAME = os.getenv('MAIL_USERNAME')
     MAIL_PASSWORD = os.getenv('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.getenv('MAIL_USERNAME')
     
+    # Mail outbox: worker threads per serving process, started at boot (0
+    # leaves delivery to `flask mail-outbox`), retry backoff and SMTP
+    # connection reuse
+    MAIL_OUTBOX_WORKERS = int(os.getenv('MAIL_OUTBOX_WORKERS', 2))
+    MAIL_OUTBOX_POLL_INTERVAL = float(os.getenv('MAIL_OUTBOX_POLL_INTERVAL', 5))
+    MAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv('MAIL_OUTBOX_MAX_ATTEMPTS', 5))
+    MAIL_OUTBOX_BACKOFF_BASE = float(os.getenv('MAIL_OUTBOX_BACKOFF_BASE', 10))
+    MAIL_OUTBOX_BACKOFF_MAX = float(os.getenv('MAIL_OUTBOX_BACKOFF_MAX', 900))
+    MAIL_OUTBOX_LEASE_SECONDS = int(os.getenv('MAIL_OUTBOX_LEASE_SECONDS', 120))
+    MAIL_CONNECTION_IDLE_TIMEOUT = float(os.getenv('MAIL_CONNECTION_IDLE_TIMEOUT', 60))
+    
+    # Bulk contact import
+    IMPORT_CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', 1000))
+    IMPORT_MAX_ERRORS = int(os.getenv('IMPORT_MAX_ERRORS', 1000))
+    
+    # Streaming export cursor batch size
+    EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 500))
+    
+    # Activity log writer: 'sync', 'async' (batched background flush) or 'disabled'
+    ACTIVITY_LOG_MODE = os.getenv('ACTIVITY_LOG_MODE', 'async')
+    ACTIVITY_LOG_BATCH_SIZE = int(os.getenv('ACTIVITY_LOG_BATCH_SIZE', 100))
+    ACTIVITY_LOG_FLUSH_INTERVAL = float(os.getenv('ACTIVITY_LOG_FLUSH_INTERVAL', 0.5))
+    ACTIVITY_LOG_QUEUE_SIZE = int(os.getenv('ACTIVITY_LOG_QUEUE_SIZE', 10000))
+    ACTIVITY_LOG_ENQUEUE_TIMEOUT = float(os.getenv('ACTIVITY_LOG_ENQUEUE_TIMEOUT', 0.05))
+    ACTIVITY_LOG_WRITE_RETRIES = int(os.getenv('ACTIVITY_LOG_WRITE_RETRIES', 3))
+    
+    # Contact listing page sizes
+    CONTACTS_PAGE_SIZE = int(os.getenv('CONTACTS_PAGE_SIZE', 50))
+    CONTACTS_MAX_PAGE_SIZE = int(os.getenv('CONTACTS_MAX_PAGE_SIZE', 200))
+    
+    # Most registration numbers one POST /api/contacts/lookup may resolve
+    CONTACTS_LOOKUP_MAX = int(os.getenv('CONTACTS_LOOKUP_MAX', 1000))
+    
+    # Contact prefix search; SEARCH_TYPEAHEAD_USERS > 0 keeps in-memory
+    # type-ahead indexes for that many users with large contact books
+    SEARCH_RESULTS_LIMIT = int(os.getenv('SEARCH_RESULTS_LIMIT', 10))
+    SEARCH_MAX_RESULTS = int(os.getenv('SEARCH_MAX_RESULTS', 50))
+    SEARCH_TYPEAHEAD_USERS = int(os.getenv('SEARCH_TYPEAHEAD_USERS', 0))
+    SEARCH_TYPEAHEAD_TTL = int(os.getenv('SEARCH_TYPEAHEAD_TTL', 300))
+    SEARCH_TYPEAHEAD_MIN_CONTACTS = int(os.getenv('SEARCH_TYPEAHEAD_MIN_CONTACTS', 5000))
+    
+    # JSON responses: 'auto' uses orjson when installed, 'json' forces the stdlib
+    JSON_BACKEND = os.getenv('JSON_BACKEND', 'auto')
+    
+    # Activity retention: 'compact' expires raw rows with `flask compact-activities`
+    # (optionally archiving them to ACTIVITY_ARCHIVE_DIR), 'ttl' lets a MongoDB
+    # TTL index expire them once `flask backfill-rollups` has counted the rows
+    # older than the daily rollups, 'off' keeps everything. Switching between
+    # 'ttl' and 'compact' requires dropping the existing timestamp index first.
+    ACTIVITY_RETENTION_MODE = os.getenv('ACTIVITY_RETENTION_MODE', 'compact')
+    ACTIVITY_RETENTION_DAYS = int(os.getenv('ACTIVITY_RETENTION_DAYS', 30))
+    ACTIVITY_ARCHIVE_DIR = os.getenv('ACTIVITY_ARCHIVE_DIR')
+    
+    # Password hashing: 'scrypt' (werkzeug default), 'pbkdf2' or 'bcrypt'.
+    # Stored hashes made with other parameters are upgraded on login.
+    PASSWORD_HASH_ALGORITHM = os.getenv('PASSWORD_HASH_ALGORITHM', 'scrypt')
+    PASSWORD_SCRYPT_N = int(os.getenv('PASSWORD_SCRYPT_N', 2 ** 15))
+    PASSWORD_PBKDF2_ITERATIONS = int(os.getenv('PASSWORD_PBKDF2_ITERATIONS', 600000))
+    PASSWORD_BCRYPT_ROUNDS = int(os.getenv('PASSWORD_BCRYPT_ROUNDS', 12))
+    
+    # Browser origins allowed to call the API
+    CORS_ORIGINS = os.getenv('CORS_ORIGINS', 'http://localhost:3000').split(',')
+    
+    # ASGI mode (asgi.py): threads serving the routes that stay on Flask
+    ASGI_WSGI_WORKERS = int(os.getenv('ASGI_WSGI_WORKERS', 10))
+    
+    # Production server (serve.py): gunicorn worker processes and threads,
+    # preloading, and recycling/shutdown timeouts. SERVER_MODE=asgi runs
+    # asgi.py's app on uvicorn workers instead of threaded WSGI workers.
+    SERVER_BIND = os.getenv('SERVER_BIND', f"0.0.0.0:{os.getenv('PORT', 5000)}")
+    SERVER_MODE = os.getenv('SERVER_MODE', 'wsgi')
+    SERVER_WORKERS = int(os.getenv('SERVER_WORKERS', (os.cpu_count() or 1) * 2 + 1))
+    SERVER_THREADS = int(os.getenv('SERVER_THREADS', 4))
+    SERVER_PRELOAD = os.getenv('SERVER_PRELOAD', 'true').lower() == 'true'
+    SERVER_TIMEOUT = int(os.getenv('SERVER_TIMEOUT', 30))
+    SERVER_GRACEFUL_TIMEOUT = int(os.getenv('SERVER_GRACEFUL_TIMEOUT', 30))
+    SERVER_KEEPALIVE = int(os.getenv('SERVER_KEEPALIVE', 5))
+    SERVER_MAX_REQUESTS = int(os.getenv('SERVER_MAX_REQUESTS', 0))
+    SERVER_MAX_REQUESTS_JITTER = int(os.getenv('SERVER_MAX_REQUESTS_JITTER', 0))
+    
+    # Dashboard stats stream: 'poll' reads the user_stats version of every
+    # watched user once per STATS_EVENTS_POLL_INTERVAL and so sees writes of
+    # every process, 'changestream' relays activity inserts as they happen
+    # (replica set only), 'local' only publishes writes of the same process
+    # and is the default for a single server process.
+    # Under WSGI each open stream holds a server thread, so at most
+    # STATS_STREAM_MAX_THREADED are served per process (a quarter of
+    # SERVER_THREADS by default) and further dashboards poll; in ASGI mode
+    # streams run on the event loop, up to STATS_STREAM_MAX_CONNECTIONS.
+    STATS_EVENTS_BACKEND = os.getenv('STATS_EVENTS_BACKEND', 'local' if SERVER_WORKERS == 1 else 'poll')
+    STATS_EVENTS_POLL_INTERVAL = float(os.getenv('STATS_EVENTS_POLL_INTERVAL', 2))
+    STATS_STREAM_KEEPALIVE = float(os.getenv('STATS_STREAM_KEEPALIVE', 25))
+    STATS_STREAM_QUEUE_SIZE = int(os.getenv('STATS_STREAM_QUEUE_SIZE', 16))
+    STATS_STREAM_MAX_CONNECTIONS = int(os.getenv('STATS_STREAM_MAX_CONNECTIONS', 500))
+    STATS_STREAM_MAX_THREADED = int(os.getenv('STATS_STREAM_MAX_THREADED', max(1, SERVER_THREADS // 4)))
+    
+    # Password hashing pool: 'process' or 'thread' workers (0 hashes on the
+    # request thread); requests beyond workers + queue get 429 + Retry-After.
+    # Both limits apply per server process, so the default splits the CPUs
+    # between the SERVER_WORKERS processes.
+    HASH_POOL_KIND = os.getenv('HASH_POOL_KIND', 'process')
+    HASH_POOL_WORKERS = int(os.getenv('HASH_POOL_WORKERS', max(1, (os.cpu_count() or 1) // SERVER_WORKERS)))
+    HASH_POOL_MAX_QUEUE = int(os.getenv('HASH_POOL_MAX_QUEUE', 8))
+    HASH_POOL_ADMISSION_TIMEOUT = float(os.getenv('HASH_POOL_ADMISSION_TIMEOUT', 0.05))
+    HASH_POOL_TIMEOUT = float(os.getenv('HASH_POOL_TIMEOUT', 10))
+    
+    # search_contacts lookup cache: per-process LRU of contact documents,
+    # optionally backed by a SQLite file shared by the workers of a host
+    # (CONTACT_CACHE_BACKEND=sqlite, file in /dev/shm unless
+    # CONTACT_CACHE_PATH is set)
+    CONTACT_CACHE_SIZE = int(os.getenv('CONTACT_CACHE_SIZE', 10000))
+    CONTACT_CACHE_TTL = int(os.getenv('CONTACT_CACHE_TTL', 300))
+    CONTACT_CACHE_BACKEND = os.getenv('CONTACT_CACHE_BACKEND', 'memory')
+    CONTACT_CACHE_PATH = os.getenv('CONTACT_CACHE_PATH')
+    
     # JWT settings
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY')
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
     
+    # Authenticated user cache used by token_required
+    USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 1024))
+    USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', 60))
+    
     # Frontend URL
     FRONTEND_URL = os.getenv('FRONTEND_URL')
\ No newline at end of file
@@ -289,9 +289,90 @@ export default function Dashboard() {
     );
 
     useEffect(() => {
-        fetchStats()
-        const statsInterval = setInterval(fetchStats, 60000) // Update every minute
-        return () => clearInterval(statsInterval)
+        let cancelled = false
+        let retryTimer = null
+        let pollTimer = null
+        const controller = new AbortController()
+
+        // Fall back to polling every minute when the stream is unavailable
+        const startPolling = () => {
+            if (pollTimer) return
+            fetchStats()
+            pollTimer = setInterval(fetchStats, 60000)
+        }
+
+        const applyEvent = (event, data) => {
+            if (event === 'snapshot') {
+                setStats(data)
+                setIsLoading(false)
+            } else if (event === 'stats') {
+                // Updates can repeat activities the list already shows
+                setStats(prev => {
+                    const ids = new Set(data.activities.map(activity => activity._id))
+                    return {
+                        total_contacts: data.total_contacts,
+                        recent_added: data.recent_added,
+                        recent_activities: [
+                            ...data.activities,
+                            ...prev.recent_activities.filter(activity => !ids.has(activity._id))
+                        ].slice(0, 4)
+                    }
+                })
+            }
+        }
+
+        // Server-sent stats updates; fetch is used instead of EventSource so
+        // the token can travel in the Authorization header
+        const connect = async () => {
+            try {
+                const res = await fetch('http://127.0.0.1:5000/api/contacts/stats/stream', {
+                    headers: {
+                        'Authorization': `Bearer ${localStorage.getItem('token')}`,
+                        'Accept': 'text/event-stream'
+                    },
+                    signal: controller.signal
+                })
+                if (!res.ok || !res.body) {
+                    startPolling()
+                    return
+                }
+                const reader = res.body.pipeThrough(new TextDecoderStream()).getReader()
+                let buffer = ''
+                while (true) {
+                    const { value, done } = await reader.read()
+                    if (done) break
+                    buffer += value
+                    let boundary
+                    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                        const message = buffer.slice(0, boundary)
+                        buffer = buffer.slice(boundary + 2)
+                        let event = 'message'
+                        let data = ''
+                        for (const line of message.split('\n')) {
+                            if (line.startsWith('event:')) event = line.slice(6).trim()
+                            else if (line.startsWith('data:')) data += line.slice(5).trim()
+                        }
+                        if (data) applyEvent(event, JSON.parse(data))
+                    }
+                }
+            } catch (error) {
+                if (cancelled) return
+                console.error('Stats stream failed:', error)
+                setIsLoading(false)
+            }
+            // Reconnect after the stream drops
+            if (!cancelled && !pollTimer) {
+                retryTimer = setTimeout(connect, 5000)
+            }
+        }
+
+        connect()
+        return () => {
+            cancelled = true
+            controller.abort()
+            clearTimeout(retryTimer)
+            clearInterval(pollTimer)
+        }
     }, [])
 
     const fetchStats = async () => {
@@ -332,7 +413,9 @@ export default function Dashboard() {
                     address: '',
                     registration_number: ''
                 })
-                fetchStats() // Refresh stats after adding contact
+                // The stream may be served by another worker or poll for
+                // changes, so refresh right away; the ETag keeps this cheap
+                fetchStats()
             }
         } catch (error) {
             console.error('Failed to create contact:', error)
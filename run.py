@@ -2,5 +2,6 @@ from app import create_app
 
 app = create_app()
 
+# Development server with the reloader; production runs serve.py
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,79 @@
+from gunicorn.app.base import BaseApplication
+from app import create_app, reconnect_mongo
+from config import Config
+
+# Production entry point: python serve.py
+#
+# Runs the app under gunicorn with SERVER_WORKERS processes of
+# SERVER_THREADS threads each. With SERVER_PRELOAD the app is created once
+# in the master and forked, so imports and setup are shared; each worker
+# then opens its own Mongo client. Send SIGHUP for a graceful restart of
+# the workers, SIGTERM to drain and stop (preloaded code is only reloaded
+# by restarting the master).
+
+
+def post_fork(server, worker):
+    # Without preloading the worker creates the app itself after this hook
+    if server.app.flask_app is not None:
+        reconnect_mongo(server.app.flask_app)
+
+
+def post_worker_init(worker):
+    # Deliver mail left pending, backing off or leased by a dead worker
+    # before the restart, rather than waiting for the next enqueue
+    from app.outbox import outbox
+    outbox.ensure_started()
+
+    # Installed here because gunicorn resets signal handlers in new workers
+    if Config.PROFILE_SIGNAL:
+        import signal
+        from app.profiler import profiler
+        profiler.install_signal_handler(getattr(signal, Config.PROFILE_SIGNAL), Config.PROFILE_SIGNAL_SECONDS)
+
+
+def worker_exit(server, worker):
+    # Write out queued activities and stop the mail workers before exiting
+    from app.activity import activity_log
+    from app.outbox import outbox
+    activity_log.stop()
+    outbox.stop()
+
+
+class ProductionServer(BaseApplication):
+    def __init__(self, config=Config):
+        self.config = config
+        self.flask_app = None
+        super().__init__()
+
+    def load_config(self):
+        asgi = self.config.SERVER_MODE == 'asgi'
+        options = {
+            'bind': self.config.SERVER_BIND,
+            'workers': self.config.SERVER_WORKERS,
+            'worker_class': 'uvicorn.workers.UvicornWorker' if asgi else 'gthread',
+            'threads': self.config.SERVER_THREADS,
+            'preload_app': self.config.SERVER_PRELOAD,
+            'timeout': self.config.SERVER_TIMEOUT,
+            'graceful_timeout': self.config.SERVER_GRACEFUL_TIMEOUT,
+            'keepalive': self.config.SERVER_KEEPALIVE,
+            'max_requests': self.config.SERVER_MAX_REQUESTS,
+            'max_requests_jitter': self.config.SERVER_MAX_REQUESTS_JITTER,
+            'post_fork': post_fork,
+            'post_worker_init': post_worker_init,
+            'worker_exit': worker_exit,
+        }
+        for key, value in options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        asgi = self.config.SERVER_MODE == 'asgi'
+        if asgi:
+            app = create_app(asgi=True)
+            self.flask_app = app.wsgi_app
+        else:
+            app = self.flask_app = create_app()
+        return app
+
+
+if __name__ == '__main__':
+    ProductionServer().run()